@@ -7,10 +7,11 @@ Endpoints:
 - GET /checkout/plans - Listar planos disponiveis
 - GET /checkout/session/{session_id} - Obter detalhes da sessao
 """
+from functools import lru_cache
 from typing import Literal
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from pydantic import BaseModel, EmailStr, Field
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from pydantic import BaseModel, EmailStr, Field, TypeAdapter
 from sqlalchemy.ext.asyncio import AsyncSession
 import stripe
 
@@ -18,7 +19,7 @@ import structlog
 
 from app.database import get_db
 from app.models.license import PlanId, ProductType, LicenseStatus
-from app.services.stripe_service import StripeService, PLAN_CONFIGS
+from app.services.stripe_service import StripeService, PLAN_CONFIGS, stripe_call
 from app.services.license_service import LicenseService
 from app.config import settings
 
@@ -158,6 +159,7 @@ async def create_checkout_session(
             client_reference_id=request.client_reference_id,
             product=product,
             customer_name=request.customer_name,
+            db=db,
         )
 
         return CheckoutResponse(
@@ -247,7 +249,7 @@ async def register_free_plan(
 
 
 @router.get("/plans", response_model=list[PlanInfo])
-async def get_plans() -> list[PlanInfo]:
+async def get_plans() -> Response:
     """
     Listar todos os planos disponiveis.
 
@@ -261,22 +263,7 @@ async def get_plans() -> list[PlanInfo]:
     - PROFESSIONAL: R$ 29,90/mes - 500 req/mes
     - ENTERPRISE: R$ 99,90/mes - Ilimitado
     """
-    plans = []
-
-    for plan_id, config in PLAN_CONFIGS.items():
-        plans.append(PlanInfo(
-            id=config.plan_id.value,
-            name=config.name,
-            description=_get_plan_description(config.plan_id),
-            features=config.features,
-            price_monthly=config.price_monthly_cents,
-            price_yearly=config.price_yearly_cents,
-            requests_per_month=config.requests_per_month,
-            currency="BRL",
-            recommended=config.plan_id == PlanId.PROFESSIONAL,
-        ))
-
-    return plans
+    return Response(content=_get_plans_json(), media_type="application/json")
 
 
 @router.get("/session/{session_id}", response_model=SessionStatusResponse)
@@ -295,7 +282,8 @@ async def get_checkout_session(
     - `open`: Aguardando pagamento
     """
     try:
-        session = stripe.checkout.Session.retrieve(
+        session = await stripe_call(
+            stripe.checkout.Session.retrieve,
             session_id,
             expand=["subscription"],
         )
@@ -331,7 +319,8 @@ async def get_stripe_prices(
     Retorna os precos ativos no Stripe.
     """
     try:
-        prices = stripe.Price.list(
+        prices = await stripe_call(
+            stripe.Price.list,
             active=True,
             limit=100,
             expand=["data.product"],
@@ -363,6 +352,30 @@ async def get_stripe_prices(
 # HELPER FUNCTIONS
 # ============================================================================
 
+def _build_plans() -> list[PlanInfo]:
+    """Monta o catalogo de planos a partir de PLAN_CONFIGS."""
+    return [
+        PlanInfo(
+            id=config.plan_id.value,
+            name=config.name,
+            description=_get_plan_description(config.plan_id),
+            features=config.features,
+            price_monthly=config.price_monthly_cents,
+            price_yearly=config.price_yearly_cents,
+            requests_per_month=config.requests_per_month,
+            currency="BRL",
+            recommended=config.plan_id == PlanId.PROFESSIONAL,
+        )
+        for config in PLAN_CONFIGS.values()
+    ]
+
+
+@lru_cache
+def _get_plans_json() -> bytes:
+    """Catalogo serializado uma unica vez (PLAN_CONFIGS e estatico)."""
+    return TypeAdapter(list[PlanInfo]).dump_json(_build_plans())
+
+
 def _get_plan_description(plan: PlanId) -> str:
     """Get plan description."""
     descriptions = {
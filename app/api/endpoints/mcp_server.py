@@ -35,6 +35,7 @@ router = APIRouter(prefix="/mcp", tags=["MCP Server"])
 
 # Importar o gerenciador de conexões WebSocket
 from app.api.endpoints.mcp_websocket import manager as ws_manager
+from app.services.usage_service import UsageService
 
 # Playwright automation (fallback when extension not connected)
 try:
@@ -69,6 +70,9 @@ CACHEABLE_TOOLS = {"sei_search_process", "sei_list_documents", "sei_get_status"}
 CACHE_TTL = {"sei_search_process": 30, "sei_list_documents": 60, "sei_get_status": 30}
 CACHE_INVALIDATING_TOOLS = {"sei_create_document", "sei_forward_process", "sei_sign_document"}
 
+# Execucoes Playwright simultaneas por sessao do browser (cada uma segura a pagina por segundos)
+PLAYWRIGHT_MAX_CONCURRENT_PER_SESSION = int(os.environ.get("SEI_MCP_MAX_CONCURRENT_PER_SESSION", "2"))
+
 
 async def _get_redis():
     """Lazy-init Redis client."""
@@ -474,7 +478,22 @@ async def handle_local_tool(tool_name: str, tool_args: dict) -> dict:
 
 
 async def handle_playwright_tool(tool_name: str, tool_args: dict, session_id: str = None) -> dict:
-    """Executa ferramenta via Playwright (fallback quando extensão não conectada)."""
+    """Executa ferramenta via Playwright (fallback quando extensão não conectada).
+
+    Limita execuções simultâneas por sessão (sorted set no Redis, ver UsageService.concurrency_slot).
+    """
+    owner_id = f"pw:{session_id or 'default'}"
+    async with UsageService.concurrency_slot(owner_id, limit=PLAYWRIGHT_MAX_CONCURRENT_PER_SESSION) as acquired:
+        if not acquired:
+            return {
+                "content": [{"type": "text", "text": json.dumps({"error": "Muitas execuções simultâneas nesta sessão. Tente novamente."})}],
+                "isError": True
+            }
+        return await _run_playwright_tool(tool_name, tool_args, session_id)
+
+
+async def _run_playwright_tool(tool_name: str, tool_args: dict, session_id: str = None) -> dict:
+    """Despacha a ferramenta para o PlaywrightManager."""
     if not playwright_manager:
         return {
             "content": [{"type": "text", "text": json.dumps({"error": "Playwright não disponível"})}],
@@ -483,6 +502,7 @@ async def handle_playwright_tool(tool_name: str, tool_args: dict, session_id: st
 
     # Usar session_id ou criar default
     pw_session_id = session_id or "default"
+    playwright_manager.touch_session(pw_session_id)
 
     try:
         if tool_name == "sei_login":
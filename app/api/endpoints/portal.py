@@ -176,11 +176,7 @@ async def reactivate_subscription(
         )
 
     try:
-        import stripe
-        subscription = stripe.Subscription.modify(
-            license.stripe_subscription_id,
-            cancel_at_period_end=False,
-        )
+        await StripeService.reactivate_subscription(license.stripe_subscription_id)
 
         license.cancel_at_period_end = False
         license.canceled_at = None
@@ -8,6 +8,7 @@ Webhooks configurados:
 - customer.subscription.deleted - Assinatura cancelada
 - invoice.paid - Fatura paga com sucesso
 - invoice.payment_failed - Falha no pagamento
+- customer.deleted - Cliente removido (limpa cache email -> customer)
 
 Para configurar no Stripe Dashboard:
 1. Va em Developers > Webhooks
@@ -17,17 +18,23 @@ Para configurar no Stripe Dashboard:
 """
 import stripe
 from fastapi import APIRouter, Request, HTTPException, Depends
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 import structlog
 
 from app.database import get_db
 from app.services.stripe_service import StripeService, PLAN_REQUEST_LIMITS
-from app.services.license_service import LicenseService
+from app.services.license_service import LicenseService, invalidate_license_plans
 from app.models.license import LicenseStatus, PlanId
+from app.models.processed_event import ProcessedEvent
+from app.services.redis_client import get_redis
 
 logger = structlog.get_logger()
 
+# Janela do atalho de dedup no Redis (Stripe retenta por ate 3 dias; o banco cobre o resto)
+WEBHOOK_DEDUP_TTL_S = 24 * 3600
+
 router = APIRouter(prefix="/webhooks", tags=["webhooks"])
 
 
@@ -57,6 +64,7 @@ async def stripe_webhook(
     **Seguranca:**
     - Verifica assinatura do webhook usando STRIPE_WEBHOOK_SECRET
     - Rejeita eventos com assinatura invalida
+    - Ignora reentregas de eventos ja processados (Redis + tabela processed_events)
     """
     # Get raw body for signature verification
     payload = await request.body()
@@ -85,6 +93,19 @@ async def stripe_webhook(
         event_id=event_id,
     )
 
+    # Atalho de leitura: a chave so e gravada depois do commit. A fonte de verdade
+    # e o insert em processed_events, na mesma transacao do handler
+    redis_key = f"stripe:evt:{event_id}"
+    redis = await get_redis()
+    if redis is not None:
+        try:
+            if await redis.exists(redis_key):
+                logger.info("webhook_duplicate", event_type=event_type, event_id=event_id)
+                return {"status": "duplicate", "event_type": event_type, "event_id": event_id}
+        except Exception as e:
+            logger.warning("webhook_dedup_unavailable", event_id=event_id, error=str(e))
+            redis = None
+
     license_service = LicenseService(db)
 
     try:
@@ -99,14 +120,25 @@ async def stripe_webhook(
             "invoice.payment_failed": handle_invoice_payment_failed,
             "customer.subscription.paused": handle_subscription_paused,
             "customer.subscription.resumed": handle_subscription_resumed,
+            "customer.deleted": handle_customer_deleted,
         }
 
         handler = handlers.get(event_type)
 
         if handler:
+            # Registro na mesma transacao do handler: retentativa apos commit e ignorada
+            if not await _mark_event_processed(db, event_id, event_type):
+                logger.info("webhook_already_processed", event_type=event_type, event_id=event_id)
+                return {"status": "duplicate", "event_type": event_type, "event_id": event_id}
             await handler(event, license_service, db)
             await db.commit()
+            await invalidate_license_plans(license_service.plan_changes)
             logger.info("webhook_processed", event_type=event_type, event_id=event_id)
+            if redis is not None:
+                try:
+                    await redis.set(redis_key, 1, ex=WEBHOOK_DEDUP_TTL_S)
+                except Exception as e:
+                    logger.warning("webhook_dedup_unavailable", event_id=event_id, error=str(e))
         else:
             logger.info("webhook_event_ignored", event_type=event_type)
 
@@ -123,6 +155,18 @@ async def stripe_webhook(
         raise HTTPException(status_code=500, detail=f"Error processing webhook: {str(e)}")
 
 
+async def _mark_event_processed(db: AsyncSession, event_id: str, event_type: str) -> bool:
+    """Registra o evento; False se ja tinha sido processado."""
+    stmt = (
+        pg_insert(ProcessedEvent)
+        .values(stripe_event_id=event_id, event_type=event_type)
+        .on_conflict_do_nothing(index_elements=[ProcessedEvent.stripe_event_id])
+        .returning(ProcessedEvent.stripe_event_id)
+    )
+    result = await db.execute(stmt)
+    return result.scalar_one_or_none() is not None
+
+
 # ============================================================================
 # WEBHOOK HANDLERS
 # ============================================================================
@@ -195,8 +239,8 @@ async def handle_subscription_created(
     data = StripeService.parse_subscription_event(event)
 
     # Get customer email
-    customer = stripe.Customer.retrieve(data["customer_id"])
-    email = customer.email
+    customer = await StripeService.get_customer(data["customer_id"])
+    email = customer.email if customer else None
 
     if not email:
         logger.error("subscription_no_email", customer_id=data["customer_id"])
@@ -238,8 +282,8 @@ async def handle_subscription_updated(
     data = StripeService.parse_subscription_event(event)
 
     # Get customer email
-    customer = stripe.Customer.retrieve(data["customer_id"])
-    email = customer.email
+    customer = await StripeService.get_customer(data["customer_id"])
+    email = customer.email if customer else None
 
     if not email:
         logger.error("subscription_update_no_email", customer_id=data["customer_id"])
@@ -285,6 +329,7 @@ async def handle_subscription_deleted(
     if license:
         license.status = LicenseStatus.CANCELED
         license.canceled_at = data["canceled_at"]
+        service.plan_changes.add(license.id)
 
         logger.info(
             "subscription_deleted",
@@ -445,6 +490,25 @@ async def handle_subscription_resumed(
         )
 
 
+async def handle_customer_deleted(
+    event: dict,
+    service: LicenseService,
+    db: AsyncSession,
+) -> None:
+    """
+    Handle customer deleted.
+
+    Desvincula o customer das licencas e remove dos caches (local e Redis)
+    para que o proximo checkout com o mesmo email crie um customer novo.
+    """
+    customer = event["data"]["object"]
+
+    await service.clear_stripe_customer(customer["id"])
+    await StripeService.forget_customer(customer["id"], customer.get("email"))
+
+    logger.info("customer_deleted", customer_id=customer["id"])
+
+
 # ============================================================================
 # WEBHOOK DE TESTE
 # ============================================================================
@@ -48,6 +48,7 @@ class Settings(BaseSettings):
     stripe_secret_key: str = ""
     stripe_webhook_secret: str = ""
     stripe_publishable_key: str = ""
+    stripe_max_concurrency: int = 20  # Chamadas simultaneas ao Stripe por processo
 
     # JWT
     jwt_secret_key: str = "change-me-in-production"
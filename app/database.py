@@ -162,6 +162,38 @@ async def _run_migrations(conn) -> None:
             "CREATE INDEX IF NOT EXISTS idx_users_api_token_hash ON users(api_token_hash)"
         ))
 
+    # Migration 005: Add licenses.total_operations counter (backfilled from usage_records)
+    result = await conn.execute(text("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_name = 'licenses' AND column_name = 'total_operations'
+    """))
+    if not result.fetchone():
+        logger.info("Adding total_operations column...")
+        await conn.execute(text(
+            "ALTER TABLE licenses ADD COLUMN total_operations BIGINT NOT NULL DEFAULT 0"
+        ))
+        await conn.execute(text("""
+            UPDATE licenses l SET total_operations = u.total
+            FROM (
+                SELECT license_id, SUM(operations_count) AS total
+                FROM usage_records GROUP BY license_id
+            ) u
+            WHERE l.id = u.license_id
+        """))
+
+    # Migration 006: Replace the usage_date B-tree with a BRIN index
+    result = await conn.execute(text("""
+        SELECT indexname FROM pg_indexes
+        WHERE tablename = 'usage_records' AND indexname = 'idx_usage_date'
+    """))
+    if result.fetchone():
+        logger.info("Replacing idx_usage_date with BRIN index...")
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS idx_usage_date_brin ON usage_records "
+            "USING BRIN (usage_date) WITH (pages_per_range = 32)"
+        ))
+        await conn.execute(text("DROP INDEX IF EXISTS idx_usage_date"))
+
 
 async def close_db() -> None:
     """Close database connections."""
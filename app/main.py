@@ -4,6 +4,7 @@ Iudex Licensing API - Full Version
 API de licenciamento para SEI-MCP e Tribunais-MCP.
 Gerencia assinaturas, checkout Stripe, autenticacao Google OAuth.
 """
+import asyncio
 from contextlib import asynccontextmanager
 import logging
 import sys
@@ -62,9 +63,23 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Database init error: {e}")
         # Continue anyway - health check will show status
+    # Flush periodico dos contadores de uso (Redis -> Postgres)
+    flushers = []
+    try:
+        from app.services.usage_service import run_usage_flusher
+        flushers.append(asyncio.create_task(run_usage_flusher()))
+    except Exception as e:
+        logger.error(f"Background flushers not started: {e}")
     yield
     # Shutdown
     logger.info("Shutting down app")
+    for task in flushers:
+        task.cancel()
+    for task in flushers:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
     try:
         await close_db()
     except Exception as e:
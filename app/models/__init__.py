@@ -2,12 +2,14 @@
 Database models for the Licensing API
 """
 from app.models.license import License, LicenseStatus, ProductType
+from app.models.processed_event import ProcessedEvent
 from app.models.usage import UsageRecord
 from app.models.user import User
 
 __all__ = [
     "License",
     "LicenseStatus",
+    "ProcessedEvent",
     "ProductType",
     "UsageRecord",
     "User",
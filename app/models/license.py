@@ -6,7 +6,7 @@ from enum import Enum
 from typing import TYPE_CHECKING
 from uuid import uuid4
 
-from sqlalchemy import DateTime, Enum as SQLEnum, String, Boolean, Index
+from sqlalchemy import BigInteger, DateTime, Enum as SQLEnum, String, Boolean, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -121,6 +121,14 @@ class License(Base):
         nullable=True,
     )
 
+    # Total de operacoes (soma de usage_records, mantida incrementalmente)
+    total_operations: Mapped[int] = mapped_column(
+        BigInteger,
+        nullable=False,
+        default=0,
+        server_default="0",
+    )
+
     # Timestamps
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
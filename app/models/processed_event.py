@@ -0,0 +1,39 @@
+"""
+Processed Stripe webhook events (idempotency guard)
+"""
+from datetime import datetime
+
+from sqlalchemy import DateTime, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class ProcessedEvent(Base):
+    """
+    Stripe event already applied to the database.
+
+    Inserted in the same transaction as the webhook handler, so a retried
+    delivery of the same event id is skipped instead of reprocessed.
+    """
+
+    __tablename__ = "processed_events"
+
+    stripe_event_id: Mapped[str] = mapped_column(
+        String(255),
+        primary_key=True,
+    )
+
+    event_type: Mapped[str] = mapped_column(
+        String(100),
+        nullable=False,
+    )
+
+    processed_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=datetime.utcnow,
+    )
+
+    def __repr__(self) -> str:
+        return f"<ProcessedEvent {self.stripe_event_id} ({self.event_type})>"
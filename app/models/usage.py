@@ -94,9 +94,16 @@ class UsageRecord(Base):
     )
 
     # Indexes for efficient queries
+    # B-tree composto para lookups por licenca; BRIN (minusculo, tabela append-only
+    # por data) para varreduras so por usage_date
     __table_args__ = (
         Index("idx_usage_license_date", "license_id", "usage_date", unique=True),
-        Index("idx_usage_date", "usage_date"),
+        Index(
+            "idx_usage_date_brin",
+            "usage_date",
+            postgresql_using="brin",
+            postgresql_with={"pages_per_range": 32},
+        ),
     )
 
     def __repr__(self) -> str:
@@ -1,18 +1,29 @@
 """
 License management service
 """
+import asyncio
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 import structlog
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
 from app.models.license import License, LicenseStatus, PlanId, ProductType
+from app.services.redis_client import get_redis
 
 logger = structlog.get_logger()
 
+# Plano por licenca no Redis (`lic:{id}`); so muda via webhook, que apaga apos o commit
+# e de novo LICENSE_PLAN_REDELETE_S depois (leitor que leu o banco antes do commit pode
+# regravar o plano antigo). O TTL curto limita o que ainda escapar
+LICENSE_PLAN_CACHE_TTL_S = 300
+LICENSE_PLAN_REDELETE_S = 2.0
+
+# Referencias fortes das tasks de re-delete (o loop so guarda referencias fracas)
+_redelete_tasks: set[asyncio.Task] = set()
+
 
 # Plan limits configuration
 # Limites de requisicoes por MES (nao por dia)
@@ -36,6 +47,9 @@ class LicenseService:
 
     def __init__(self, db: AsyncSession):
         self.db = db
+        # Licencas com plano alterado nesta transacao: o chamador invalida o cache
+        # (invalidate_license_plans) depois do commit
+        self.plan_changes: set[str] = set()
 
     async def get_by_email(
         self,
@@ -56,6 +70,49 @@ class LicenseService:
         result = await self.db.execute(stmt)
         return result.scalar_one_or_none()
 
+    async def get_plan_cached(self, license_id: str) -> PlanId | None:
+        """Get a license's plan, cached in Redis (None if the license doesn't exist)."""
+        key = f"lic:{license_id}"
+        redis = await get_redis()
+        if redis is not None:
+            try:
+                plan = await redis.get(key)
+                if plan:
+                    return PlanId(plan)
+            except Exception as e:
+                logger.warning("license_cache_read_failed", license_id=license_id, error=str(e))
+                redis = None
+
+        stmt = select(License.plan).where(License.id == license_id)
+        result = await self.db.execute(stmt)
+        plan = result.scalar_one_or_none()
+        if plan is not None and redis is not None:
+            await cache_license_plan(license_id, plan)
+        return plan
+
+    async def get_stripe_customer_id(self, email: str) -> str | None:
+        """Get the Stripe customer ID already linked to an email (any product)."""
+        stmt = (
+            select(License.stripe_customer_id)
+            .where(
+                License.email == email,
+                License.stripe_customer_id.is_not(None),
+            )
+            .limit(1)
+        )
+        result = await self.db.execute(stmt)
+        return result.scalar_one_or_none()
+
+    async def clear_stripe_customer(self, customer_id: str) -> None:
+        """Unlink a deleted Stripe customer from its licenses."""
+        stmt = (
+            update(License)
+            .where(License.stripe_customer_id == customer_id)
+            .values(stripe_customer_id=None)
+            .execution_options(synchronize_session="fetch")
+        )
+        await self.db.execute(stmt)
+
     async def get_by_stripe_subscription(self, subscription_id: str) -> License | None:
         """Get a license by Stripe subscription ID."""
         stmt = select(License).where(License.stripe_subscription_id == subscription_id)
@@ -130,6 +187,7 @@ class LicenseService:
             license.cancel_at_period_end = cancel_at_period_end
             license.canceled_at = canceled_at
             license.updated_at = datetime.now(timezone.utc)
+            self.plan_changes.add(license.id)
 
             logger.info(
                 "license_updated_from_stripe",
@@ -249,3 +307,44 @@ class LicenseService:
             return f"Assinatura ativa. Cancela em {days_remaining} dias."
 
         return "Licenca ativa"
+
+
+async def cache_license_plan(license_id: str, plan: PlanId) -> None:
+    """Grava o plano (lido do banco) da licenca no Redis."""
+    redis = await get_redis()
+    if redis is None:
+        return
+    try:
+        await redis.set(f"lic:{license_id}", plan.value, ex=LICENSE_PLAN_CACHE_TTL_S)
+    except Exception as e:
+        logger.warning("license_cache_write_failed", license_id=license_id, error=str(e))
+
+
+async def _delete_license_plans(redis, license_ids: set[str]) -> None:
+    try:
+        await redis.delete(*(f"lic:{license_id}" for license_id in license_ids))
+    except Exception as e:
+        logger.warning("license_cache_delete_failed", license_ids=list(license_ids), error=str(e))
+
+
+async def _redelete_license_plans(redis, license_ids: set[str]) -> None:
+    await asyncio.sleep(LICENSE_PLAN_REDELETE_S)
+    await _delete_license_plans(redis, license_ids)
+
+
+async def invalidate_license_plans(license_ids: set[str]) -> None:
+    """Remove o plano das licencas do cache. Chamar so depois do commit.
+
+    Apaga na hora e agenda um segundo delete (double delete) para o leitor que
+    consultou o banco antes do commit e gravou o plano antigo depois do primeiro.
+    """
+    if not license_ids:
+        return
+    redis = await get_redis()
+    if redis is None:
+        return
+    license_ids = set(license_ids)
+    await _delete_license_plans(redis, license_ids)
+    task = asyncio.create_task(_redelete_license_plans(redis, license_ids))
+    _redelete_tasks.add(task)
+    task.add_done_callback(_redelete_tasks.discard)
@@ -6,6 +6,8 @@ Usado como fallback quando extensão não está conectada.
 
 Best practices aplicadas (pesquisa 2026-01-27):
 - waitUntil: 'domcontentloaded' em vez de 'networkidle' (desencorajado pelo Playwright)
+- Locators/smart_* com auto-waiting em vez de wait_for_load_state explícito após cliques
+  (wait explícito só antes de leituras sem auto-wait: evaluate_all, accessibility.snapshot)
 - frameLocator() para iframes (auto-waiting) em vez de frame()
 - getByRole()/getByText() quando possível (resilientes a mudanças de DOM)
 - ARIA snapshots com scope por iframe (tree/view/main/full)
@@ -15,16 +17,24 @@ Refs: microsoft/playwright-mcp, browser-use/browser-use, browserbase/stagehand
 """
 
 import asyncio
-import base64
+import hashlib
+import hmac
 import logging
 import os
 import re
+import secrets
 import time
-from datetime import datetime
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from enum import IntEnum
 from typing import Dict, Optional, Any
+from urllib.parse import urlsplit
 from dataclasses import dataclass, field
 
-from app.services.resilience import smart_query, smart_click, smart_fill, smart_select
+from app.services.resilience import (
+    smart_query, smart_click, smart_fill, smart_select, DOM_SNAP_INIT_SCRIPT, b64encode_str,
+    invalidate_page_cache,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -32,6 +42,7 @@ logger = logging.getLogger(__name__)
 playwright_available = False
 try:
     from playwright.async_api import async_playwright, Browser, Page, BrowserContext, Frame
+    from playwright.async_api import TimeoutError as PlaywrightTimeoutError
     playwright_available = True
 except ImportError:
     logger.warning("Playwright not installed. Browser automation disabled.")
@@ -39,6 +50,88 @@ except ImportError:
     Page = None
     BrowserContext = None
     Frame = None
+    PlaywrightTimeoutError = TimeoutError
+
+# Sessões ociosas além deste TTL são fechadas pelo GC em background
+SESSION_IDLE_TTL_S = float(os.environ.get("SEI_MCP_SESSION_IDLE_TTL_S", "1800"))
+SESSION_GC_INTERVAL_S = 60.0
+
+# Pool de BrowserContexts aquecidos (reaproveitados entre sessões não autenticadas)
+CONTEXT_POOL_MAX = int(os.environ.get("SEI_MCP_CONTEXT_POOL_MAX", "4"))
+CONTEXT_POOL_IDLE_TTL_S = 300.0
+
+# Máximo de entradas de cache por sessão e por tag (LRU — evita crescimento ilimitado)
+CACHE_MAX_ENTRIES = int(os.environ.get("SEI_MCP_CACHE_MAX", "128"))
+
+# Regexes de limpeza do snapshot ARIA (compiladas uma vez no load do módulo)
+_RE_MENU_COPIA = re.compile(r'^\s*- link "Menu cópia protocolo".*$\n?', re.MULTILINE)
+_RE_ASSINADO = re.compile(r'link "Assinado por: (.+?)"')
+_RE_IMG_DECOR = re.compile(r'^\s*- img \[ref=\w+\]( \[cursor=pointer\])?\s*$\n?', re.MULTILINE)
+
+# Cache de assets estáticos (js/css/imagens/fontes) compartilhado entre sessões
+ASSET_CACHE_MAX_BYTES = int(os.environ.get("SEI_MCP_ASSET_CACHE_MB", "200")) * 1024 * 1024
+_RE_STATIC_ASSET = re.compile(r'(?i)\.(js|css|png|jpg|svg|woff2?)$')
+# Headers nunca replicados a partir do cache (estado de sessão, auth e hop-by-hop)
+_ASSET_UNCACHED_HEADERS = frozenset({
+    "set-cookie", "set-cookie2", "authorization", "www-authenticate",
+    "connection", "keep-alive", "transfer-encoding", "te", "trailer", "upgrade",
+})
+
+
+def _is_static_asset(url: str) -> bool:
+    """True se o path da URL (sem query/fragmento) termina em extensão de asset estático."""
+    return _RE_STATIC_ASSET.search(urlsplit(url).path) is not None
+
+# Light mode: bloqueia imagens/fontes/mídia (automação só precisa do texto do DOM).
+# Opt-in: screenshots de páginas carregadas em light mode (inclusive as do agent
+# fallback em resilience.py) saem sem imagens/fontes
+LIGHT_MODE_DEFAULT = os.environ.get("SEI_MCP_LIGHT_MODE", "false").lower() == "true"
+# Classificado pelo resource_type da requisição (pega também URLs sem extensão,
+# ex.: imagens servidas por controlador.php). CSS fica: afeta checagens de visibilidade.
+_HEAVY_RESOURCE_TYPES = frozenset({"image", "font", "media"})
+
+# Chave do HMAC que identifica o estado autenticado salvo (por processo: nunca sai da memória)
+_AUTH_STATE_KEY = secrets.token_bytes(32)
+
+# URLs que sinalizam navegação concluída (wait_for_url retorna assim que a URL aparece)
+# Pós-login: só a tela inicial do SEI (controlador.php casa com quase toda URL do SEI)
+_RE_POST_LOGIN_URL = re.compile(r'(?i)controlador\.php\?acao=(procedimento_controlar|principal)')
+_RE_PROCESS_URL = re.compile(r'(?i)processo')
+
+# Probes com negative cache: links de navegação com seletores alternativos, cuja
+# ausência numa URL não muda com o tempo (ver _cached_probe)
+_NEGATIVE_CACHED_PROBES = frozenset({"search:nav", "get_status:andamento", "logout:sair"})
+
+# Coleta em lote no browser: Locator.evaluate_all recebe todos os elementos em um único
+# round-trip CDP (equivale a all_inner_texts(), mas com limite aplicado no browser)
+_JS_INNER_TEXTS = """(els, limit) => els.slice(0, limit).map(e => (e.innerText || '').trim())"""
+
+# Limpa o storage da origem da página antes de devolver o context ao pool
+_JS_CLEAR_STORAGE = """async () => {
+    try { localStorage.clear(); sessionStorage.clear(); } catch (e) {}
+    try { for (const k of await caches.keys()) await caches.delete(k); } catch (e) {}
+    try { for (const db of await indexedDB.databases()) indexedDB.deleteDatabase(db.name); } catch (e) {}
+    try { for (const r of await navigator.serviceWorker.getRegistrations()) await r.unregister(); } catch (e) {}
+}"""
+
+_JS_ROW_LINKS = """(els, limit) => els.slice(0, limit).map(e => {
+    const a = e.matches('a[href]') ? e : e.querySelector('a[href]');
+    return {text: (e.innerText || '').trim(), href: a ? a.href : ''};
+})"""
+
+_JS_DOC_LINKS = """(els) => els.map(e => ({text: (e.innerText || '').trim(), href: e.getAttribute('href') || ''}))"""
+
+# Prefixos de indentação pré-calculados para a serialização da árvore ARIA
+_INDENT = ["  " * d for d in range(32)]
+
+
+class CacheTag(IntEnum):
+    """Partições do cache de sessão (invalidação por tag é um clear() O(1))."""
+    SEARCH = 0
+    LIST_DOCS = 1
+    STATUS = 2
+    SNAP = 3
+    PROBE = 4
 
 
 @dataclass
@@ -56,12 +149,17 @@ class PlaywrightSession:
     context: Any  # BrowserContext
     page: Any  # Page
     base_url: str
-    created_at: datetime = field(default_factory=datetime.utcnow)
-    last_activity: datetime = field(default_factory=datetime.utcnow)
+    created_at: float = field(default_factory=time.time)
+    last_activity: float = field(default_factory=time.monotonic)  # relógio monotônico
     logged_in: bool = False
     user: Optional[str] = None
     current_process_number: Optional[str] = None
-    cache: Dict[str, CacheEntry] = field(default_factory=dict)
+    light_mode: bool = False
+    auth_key: Optional[bytes] = None  # credenciais que autenticaram a sessão (ver _auth_key)
+    authenticated: bool = False  # já esteve autenticada (context não volta ao pool)
+    cache: "Dict[CacheTag, OrderedDict[bytes, CacheEntry]]" = field(
+        default_factory=lambda: {tag: OrderedDict() for tag in CacheTag}
+    )
 
 
 class PlaywrightManager:
@@ -69,9 +167,21 @@ class PlaywrightManager:
 
     def __init__(self):
         self.sessions: Dict[str, PlaywrightSession] = {}
+        # Criações em andamento por session_id (chamadas concorrentes aguardam a mesma)
+        self._pending_sessions: Dict[str, asyncio.Future] = {}
+        # Estado autenticado (cookies/localStorage) por HMAC(url, usuário, senha) — evita
+        # re-login sem entregar a sessão de um usuário a quem não conhece a senha
+        self._auth_states: Dict[bytes, dict] = {}
         self._playwright = None
         self._browser: Optional[Any] = None
         self._lock = asyncio.Lock()
+        self._gc_task: Optional[asyncio.Task] = None
+        # Contexts livres: (context, momento em que voltou ao pool)
+        self._context_pool: deque = deque()
+
+        # Cache LRU de assets estáticos: url -> (headers, body)
+        self._asset_cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._asset_cache_bytes = 0
 
         # Configurações
         self.headless = os.environ.get("SEI_MCP_HEADLESS", "true").lower() == "true"
@@ -92,14 +202,52 @@ class PlaywrightManager:
                     )
                     logger.info(f"Playwright browser started (headless={self.headless})")
 
-    async def create_session(self, session_id: str, base_url: str) -> PlaywrightSession:
-        """Cria nova sessão Playwright."""
+        if self._gc_task is None:
+            self._gc_task = asyncio.create_task(self._gc_loop())
+
+    async def _gc_loop(self):
+        """Fecha periodicamente sessões sem atividade há mais de SESSION_IDLE_TTL_S."""
+        while True:
+            await asyncio.sleep(SESSION_GC_INTERVAL_S)
+            cutoff = time.monotonic() - SESSION_IDLE_TTL_S
+            stale = [sid for sid, s in self.sessions.items() if s.last_activity < cutoff]
+            for sid in stale:
+                try:
+                    await self.close_session(sid)
+                    logger.info(f"Playwright session idle-closed: {sid}")
+                except Exception as e:
+                    logger.warning(f"Idle session close error ({sid}): {e}")
+
+            # Fecha contexts parados no pool há mais de CONTEXT_POOL_IDLE_TTL_S
+            pool_cutoff = time.monotonic() - CONTEXT_POOL_IDLE_TTL_S
+            while self._context_pool and self._context_pool[0][1] < pool_cutoff:
+                context, _ = self._context_pool.popleft()
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+
+    async def create_session(self, session_id: str, base_url: str,
+                             light_mode: Optional[bool] = None,
+                             storage_state: Optional[dict] = None) -> PlaywrightSession:
+        """Cria nova sessão Playwright.
+
+        light_mode: bloqueia imagens/fontes/mídia (default: SEI_MCP_LIGHT_MODE, desligado).
+        storage_state: cookies/localStorage de um login anterior (pula o formulário).
+        """
         await self._ensure_browser()
 
-        context = await self._browser.new_context(
-            viewport={'width': 1280, 'height': 720},
-            user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        )
+        if self._context_pool and storage_state is None:
+            # Context aquecido do pool (rota de assets já registrada)
+            context, _ = self._context_pool.pop()
+        else:
+            context = await self._browser.new_context(
+                viewport={'width': 1280, 'height': 720},
+                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+                storage_state=storage_state
+            )
+            await context.route(_is_static_asset, self._asset_route_handler)
+            await context.add_init_script(DOM_SNAP_INIT_SCRIPT)
         page = await context.new_page()
         page.set_default_timeout(self.timeout_ms)
 
@@ -108,33 +256,88 @@ class PlaywrightManager:
             browser=self._browser,
             context=context,
             page=page,
-            base_url=base_url
+            base_url=base_url,
+            authenticated=storage_state is not None
         )
         self.sessions[session_id] = session
 
+        if LIGHT_MODE_DEFAULT if light_mode is None else light_mode:
+            await self._set_light_mode(session, True)
+
+        # Navegação invalida o negative cache e os Locators cacheados da página
+        def _on_navigated(frame):
+            if frame == page.main_frame:
+                self._invalidate_cache(session, CacheTag.PROBE)
+                invalidate_page_cache(page)
+
+        page.on("framenavigated", _on_navigated)
+        page.on("close", lambda _: invalidate_page_cache(page))
+
         logger.info(f"Playwright session created: {session_id}")
         return session
 
-    async def get_or_create_session(self, session_id: str, base_url: str) -> PlaywrightSession:
+    async def get_or_create_session(self, session_id: str, base_url: str,
+                                    storage_state: Optional[dict] = None) -> PlaywrightSession:
         """Obtém sessão existente ou cria nova."""
-        if session_id in self.sessions:
-            session = self.sessions[session_id]
-            session.last_activity = datetime.utcnow()
+        session = self.sessions.get(session_id)
+        if session is not None:
+            session.last_activity = time.monotonic()
             return session
-        return await self.create_session(session_id, base_url)
+
+        # Evita TOCTOU: chamadas concorrentes com o mesmo id compartilham uma única criação
+        future = self._pending_sessions.get(session_id)
+        if future is None:
+            future = asyncio.ensure_future(
+                self.create_session(session_id, base_url, storage_state=storage_state)
+            )
+            self._pending_sessions[session_id] = future
+            future.add_done_callback(lambda _: self._pending_sessions.pop(session_id, None))
+        return await asyncio.shield(future)
+
+    def touch_session(self, session_id: str):
+        """Marca atividade na sessão (adia o fechamento por ociosidade)."""
+        session = self.sessions.get(session_id)
+        if session is not None:
+            session.last_activity = time.monotonic()
 
     async def close_session(self, session_id: str):
         """Fecha uma sessão."""
         if session_id in self.sessions:
             session = self.sessions.pop(session_id)
+            if not session.authenticated and len(self._context_pool) < CONTEXT_POOL_MAX:
+                # Devolve o context limpo ao pool em vez de destruí-lo.
+                # Só contexts que nunca passaram do login (auth não vaza via storage)
+                try:
+                    for page in session.context.pages:
+                        await page.evaluate(_JS_CLEAR_STORAGE)
+                        await page.close()
+                    await session.context.clear_cookies()
+                    await session.context.clear_permissions()
+                    # Remove rotas da sessão (light mode etc.) e re-registra a de assets
+                    await session.context.unroute_all(behavior="ignoreErrors")
+                    session.light_mode = False
+                    await session.context.route(_is_static_asset, self._asset_route_handler)
+                    self._context_pool.append((session.context, time.monotonic()))
+                    logger.info(f"Playwright session closed (context pooled): {session_id}")
+                    return
+                except Exception as e:
+                    logger.warning(f"Context pooling failed ({session_id}): {e}")
             await session.context.close()
             logger.info(f"Playwright session closed: {session_id}")
 
     async def close_all(self):
         """Fecha todas as sessões e o browser."""
+        if self._gc_task:
+            self._gc_task.cancel()
+            self._gc_task = None
+
         for session_id in list(self.sessions.keys()):
             await self.close_session(session_id)
 
+        while self._context_pool:
+            context, _ = self._context_pool.pop()
+            await context.close()
+
         if self._browser:
             await self._browser.close()
             self._browser = None
@@ -149,43 +352,151 @@ class PlaywrightManager:
 
     def list_sessions(self) -> list:
         """Lista sessões ativas."""
+        # last_activity é monotônico — converte para relógio de parede só aqui
+        wall_offset = time.time() - time.monotonic()
         return [
             {
                 "session_id": s.id,
                 "base_url": s.base_url,
                 "logged_in": s.logged_in,
                 "user": s.user,
-                "created_at": s.created_at.isoformat(),
-                "last_activity": s.last_activity.isoformat()
+                "created_at": datetime.fromtimestamp(s.created_at, tz=timezone.utc).isoformat(),
+                "last_activity": datetime.fromtimestamp(s.last_activity + wall_offset, tz=timezone.utc).isoformat()
             }
             for s in self.sessions.values()
         ]
 
+    # ============================================
+    # Asset cache (compartilhado entre sessões)
+    # ============================================
+
+    async def _asset_route_handler(self, route, request):
+        """Serve assets estáticos do cache em memória; baixa e armazena no miss."""
+        key = request.url
+        cached = self._asset_cache.get(key)
+        if cached is not None:
+            self._asset_cache.move_to_end(key)
+            headers, body = cached
+            await route.fulfill(status=200, headers=headers, body=body)
+            return
+
+        try:
+            response = await route.fetch()
+        except Exception:
+            await route.continue_()
+            return
+
+        if request.method == "GET" and response.status == 200:
+            self._store_asset(key, response.headers, await response.body())
+        await route.fulfill(response=response)
+
+    def _store_asset(self, key: str, headers: dict, body: bytes):
+        """Armazena asset no cache LRU, limitado a ASSET_CACHE_MAX_BYTES.
+
+        Respostas com Cache-Control private/no-store não são armazenadas; headers de
+        sessão/auth e hop-by-hop são descartados antes de guardar.
+        """
+        if len(body) > ASSET_CACHE_MAX_BYTES:
+            return
+        cache_control = ""
+        for name, value in headers.items():
+            if name.lower() == "cache-control":
+                cache_control = value.lower()
+        if "private" in cache_control or "no-store" in cache_control:
+            return
+        headers = {
+            name: value for name, value in headers.items()
+            if name.lower() not in _ASSET_UNCACHED_HEADERS and not name.lower().startswith("proxy-")
+        }
+        previous = self._asset_cache.pop(key, None)
+        if previous is not None:
+            self._asset_cache_bytes -= len(previous[1])
+        self._asset_cache[key] = (headers, body)
+        self._asset_cache_bytes += len(body)
+        while self._asset_cache_bytes > ASSET_CACHE_MAX_BYTES:
+            _, (_, evicted) = self._asset_cache.popitem(last=False)
+            self._asset_cache_bytes -= len(evicted)
+
+    @staticmethod
+    async def _light_route_handler(route, request):
+        """Aborta recursos pesados; o resto segue para o asset cache/rede."""
+        if request.resource_type in _HEAVY_RESOURCE_TYPES:
+            await route.abort()
+        else:
+            await route.fallback()
+
+    async def _set_light_mode(self, session: PlaywrightSession, enabled: bool):
+        """Liga/desliga o bloqueio de imagens/fontes/mídia no contexto da sessão."""
+        if enabled == session.light_mode:
+            return
+        if enabled:
+            await session.context.route("**/*", self._light_route_handler)
+        else:
+            await session.context.unroute("**/*", self._light_route_handler)
+        session.light_mode = enabled
+
     # ============================================
     # Cache helpers
     # ============================================
 
-    def _get_cached(self, session: PlaywrightSession, key: str) -> Optional[Any]:
+    @staticmethod
+    def _cache_key(*parts: Any) -> bytes:
+        """Chave compacta (8 bytes) a partir das partes que identificam a entrada."""
+        return hashlib.blake2b("\x1f".join(map(str, parts)).encode(), digest_size=8).digest()
+
+    def _get_cached(self, session: PlaywrightSession, tag: CacheTag, key: bytes) -> Optional[Any]:
         """Retorna dados do cache se não expirados."""
-        entry = session.cache.get(key)
+        bucket = session.cache[tag]
+        entry = bucket.get(key)
         if entry and entry.expires > time.time():
+            bucket.move_to_end(key)
             return entry.data
         if entry:
-            del session.cache[key]
+            del bucket[key]
         return None
 
-    def _set_cache(self, session: PlaywrightSession, key: str, data: Any, ttl_s: float = 60.0):
-        """Armazena dados no cache com TTL."""
-        session.cache[key] = CacheEntry(data=data, expires=time.time() + ttl_s)
-
-    def _invalidate_cache(self, session: PlaywrightSession, prefix: str = ""):
-        """Invalida entradas de cache (todas ou por prefixo)."""
-        if not prefix:
-            session.cache.clear()
+    def _set_cache(self, session: PlaywrightSession, tag: CacheTag, key: bytes,
+                   data: Any, ttl_s: float = 60.0):
+        """Armazena dados no cache com TTL (LRU limitado a CACHE_MAX_ENTRIES por tag)."""
+        bucket = session.cache[tag]
+        bucket[key] = CacheEntry(data=data, expires=time.time() + ttl_s)
+        bucket.move_to_end(key)
+        while len(bucket) > CACHE_MAX_ENTRIES:
+            bucket.popitem(last=False)
+
+    def _invalidate_cache(self, session: PlaywrightSession, tag: Optional[CacheTag] = None):
+        """Invalida entradas de cache (todas ou de uma tag)."""
+        if tag is None:
+            for bucket in session.cache.values():
+                bucket.clear()
         else:
-            keys_to_del = [k for k in session.cache if k.startswith(prefix)]
-            for k in keys_to_del:
-                del session.cache[k]
+            session.cache[tag].clear()
+
+    def _dom_changed(self, session: PlaywrightSession):
+        """Invalida caches que dependem do DOM após clique/preenchimento (mesmo sem navegar)."""
+        self._invalidate_cache(session, CacheTag.PROBE)
+        self._invalidate_cache(session, CacheTag.SNAP)
+
+    async def _cached_probe(self, session: PlaywrightSession, fn, selectors: str, *args, **kwargs):
+        """Executa smart_* com negative cache: seletor que falhou nesta URL não é re-tentado por 10s.
+
+        Só para os links de navegação alternativos (_NEGATIVE_CACHED_PROBES): campos de
+        formulário, confirmações e mensagens de status mudam sem trocar de URL e são
+        sempre consultados. Entradas CacheTag.PROBE são invalidadas a cada navegação
+        do frame principal; PROBE e SNAP após qualquer clique/preenchimento.
+        """
+        cacheable = kwargs.get("context") in _NEGATIVE_CACHED_PROBES
+        if cacheable:
+            key = self._cache_key(session.page.url, selectors)
+            if self._get_cached(session, CacheTag.PROBE, key) is False:
+                return None if fn is smart_query else False
+        result = await fn(session.page, selectors, *args, **kwargs)
+        if fn is not smart_query and result:
+            # Clique/preenchimento pode mudar o DOM sem navegar
+            self._dom_changed(session)
+        elif cacheable and not result:
+            self._set_cache(session, CacheTag.PROBE, key, False, ttl_s=10.0)
+        return result
 
     async def _ensure_process_open(self, session: PlaywrightSession, process_number: str) -> dict:
         """Abre processo somente se não for o processo atual (evita navegação redundante)."""
@@ -204,15 +515,14 @@ class PlaywrightManager:
     def _clean_snapshot(snap: str) -> str:
         """Remove redundâncias do snapshot ARIA (menu lateral, ícones decorativos, etc.)."""
         # Remover linhas de "Menu cópia protocolo" repetidas
-        snap = re.sub(r'^\s*- link "Menu cópia protocolo".*$\n?', '', snap, flags=re.MULTILINE)
+        snap = _RE_MENU_COPIA.sub('', snap)
         # Resumir assinaturas longas
-        snap = re.sub(
-            r'link "Assinado por: (.+?)"',
+        snap = _RE_ASSINADO.sub(
             lambda m: f'link "Assinado: {m.group(1).split(chr(10))[0]}"',
             snap
         )
         # Remover imgs decorativas sem texto
-        snap = re.sub(r'^\s*- img \[ref=\w+\]( \[cursor=pointer\])?\s*$\n?', '', snap, flags=re.MULTILINE)
+        snap = _RE_IMG_DECOR.sub('', snap)
         return snap
 
     @staticmethod
@@ -238,6 +548,12 @@ class PlaywrightManager:
         session = self.sessions[session_id]
         page = session.page
 
+        # Cache check (evita round-trip CDP quando a página não mudou)
+        cache_key = self._cache_key(scope, include_hidden, max_length, page.url)
+        cached = self._get_cached(session, CacheTag.SNAP, cache_key)
+        if cached is not None:
+            return cached
+
         try:
             target = page
             scope_label = "full"
@@ -272,12 +588,14 @@ class PlaywrightManager:
             snap_str = self._clean_snapshot(snap_str)
             snap_str = self._truncate_snapshot(snap_str, max_length)
 
-            return {
+            result = {
                 "success": True,
                 "snapshot": snap_str,
                 "scope": scope_label,
                 "length": len(snap_str)
             }
+            self._set_cache(session, CacheTag.SNAP, cache_key, result, ttl_s=5.0)
+            return result
 
         except Exception as e:
             logger.error(f"Snapshot error: {e}")
@@ -285,27 +603,33 @@ class PlaywrightManager:
 
     @staticmethod
     def _serialize_aria_tree(node: dict, indent: int = 0) -> str:
-        """Serializa nó da árvore de acessibilidade em formato YAML-style legível."""
-        lines = []
-        prefix = "  " * indent
-        role = node.get("role", "")
-        name = node.get("name", "")
-
-        # Formatar nó
-        if name:
-            lines.append(f'{prefix}- {role} "{name}"')
-        elif role:
-            lines.append(f'{prefix}- {role}')
-
-        # Propriedades relevantes
-        if node.get("value"):
-            lines.append(f'{prefix}  value: "{node["value"]}"')
+        """Serializa nó da árvore de acessibilidade em formato YAML-style legível.
 
-        # Filhos
-        for child in node.get("children", []):
-            lines.append(PlaywrightManager._serialize_aria_tree(child, indent + 1))
-
-        return "\n".join(lines)
+        DFS iterativa escrevendo numa única lista (join uma vez só no final).
+        """
+        out: list = []
+        stack = [(node, indent)]
+        while stack:
+            n, depth = stack.pop()
+            prefix = _INDENT[depth] if depth < len(_INDENT) else "  " * depth
+            role = n.get("role", "")
+            name = n.get("name", "")
+
+            # Formatar nó
+            if name:
+                out.append(f'{prefix}- {role} "{name}"')
+            elif role:
+                out.append(f'{prefix}- {role}')
+
+            # Propriedades relevantes
+            if n.get("value"):
+                out.append(f'{prefix}  value: "{n["value"]}"')
+
+            # Filhos (invertidos para manter a ordem original no pop)
+            for child in reversed(n.get("children", ())):
+                stack.append((child, depth + 1))
+
+        return "\n".join(out)
 
     # ============================================
     # Tool composta: search_and_open
@@ -330,12 +654,19 @@ class PlaywrightManager:
         # 2. Abrir o primeiro resultado
         # Tentar extrair número do processo do texto
         first_result = results[0].get("text", query)
-        open_result = await self.open_process(session_id, query)
-        if not open_result.get("success"):
-            return open_result
+        session = self.sessions[session_id]
+        href = results[0].get("href", "")
+
+        if len(results) == 1 and href.startswith("http"):
+            # Fast path: resultado único já expõe o link — navega direto (sem pesquisa rápida)
+            await session.page.goto(href, wait_until='domcontentloaded')
+            self._invalidate_cache(session, CacheTag.SNAP)
+        else:
+            open_result = await self.open_process(session_id, query)
+            if not open_result.get("success"):
+                return open_result
 
         # Atualizar estado
-        session = self.sessions[session_id]
         session.current_process_number = query
 
         # 3. Listar documentos se solicitado
@@ -359,46 +690,79 @@ class PlaywrightManager:
     # Ações do SEI
     # ============================================
 
+    @staticmethod
+    def _auth_key(url: str, username: str, password: str) -> bytes:
+        """Chave do estado autenticado: só quem repete as mesmas credenciais a reproduz."""
+        msg = "\x1f".join((url, username, password)).encode()
+        return hmac.new(_AUTH_STATE_KEY, msg, hashlib.sha256).digest()
+
     async def login(self, session_id: str, url: str, username: str, password: str, orgao: str = None) -> dict:
         """Faz login no SEI."""
-        session = await self.get_or_create_session(session_id, url)
+        auth_key = self._auth_key(url, username, password)
+        state = self._auth_states.get(auth_key)
+        is_new = session_id not in self.sessions
+        session = await self.get_or_create_session(session_id, url, storage_state=state)
+        if is_new and state is not None:
+            # Sessão nasceu com os cookies destas credenciais
+            session.auth_key = auth_key
         page = session.page
 
         try:
             # Navegar para página de login
             await page.goto(url, wait_until='domcontentloaded')
 
+            # Estado autenticado reaproveitado: o SEI redireciona direto para a tela principal.
+            # Só vale se a sessão foi autenticada com estas mesmas credenciais
+            if (session.auth_key == auth_key and page.url != url
+                    and _RE_POST_LOGIN_URL.search(page.url)):
+                session.logged_in = True
+                session.authenticated = True
+                session.user = username
+                return {"success": True, "message": "Sessão já autenticada", "url": page.url}
+
             # Preencher credenciais (com fail-fast + self-healing)
-            if not await smart_fill(page, 'input[name="txtUsuario"], input[id="txtUsuario"], #usuario', username, context="login:usuario"):
+            if not await self._cached_probe(session, smart_fill, 'input[name="txtUsuario"], input[id="txtUsuario"], #usuario', username, context="login:usuario"):
                 return {"success": False, "error": "Campo de usuário não encontrado"}
 
-            if not await smart_fill(page, 'input[name="pwdSenha"], input[id="pwdSenha"], #senha', password, context="login:senha"):
+            if not await self._cached_probe(session, smart_fill, 'input[name="pwdSenha"], input[id="pwdSenha"], #senha', password, context="login:senha"):
                 return {"success": False, "error": "Campo de senha não encontrado"}
 
             # Selecionar órgão se necessário
             if orgao:
-                await smart_select(page, 'select[name="selOrgao"], #selOrgao', label=orgao, context="login:orgao")
+                await self._cached_probe(session, smart_select, 'select[name="selOrgao"], #selOrgao', label=orgao, context="login:orgao")
 
             # Clicar em login
-            if not await smart_click(page, 'button[type="submit"], input[type="submit"], #sbmLogin', context="login:submit"):
+            if not await self._cached_probe(session, smart_click, 'button[type="submit"], input[type="submit"], #sbmLogin', context="login:submit"):
                 return {"success": False, "error": "Botão de login não encontrado"}
 
-            # Aguardar navegação (domcontentloaded é mais rápido e confiável que networkidle)
-            await page.wait_for_load_state('domcontentloaded', timeout=10000)
-
-            # Verificar se login foi bem sucedido
-            current_url = page.url
-            if 'login' not in current_url.lower() or 'principal' in current_url.lower():
-                session.logged_in = True
-                session.user = username
-                return {"success": True, "message": "Login realizado com sucesso", "url": current_url}
-            else:
+            # Aguardar a URL pós-login (sinal preciso; não para em páginas de redirect intermediárias)
+            try:
+                await page.wait_for_url(_RE_POST_LOGIN_URL, timeout=10000)
+            except PlaywrightTimeoutError:
+                self._forget_auth(session, auth_key)
                 return {"success": False, "error": "Login falhou - verifique credenciais"}
 
+            session.logged_in = True
+            session.authenticated = True
+            session.user = username
+            session.auth_key = auth_key
+            self._invalidate_cache(session, CacheTag.SNAP)
+            self._auth_states[auth_key] = await session.context.storage_state()
+            return {"success": True, "message": "Login realizado com sucesso", "url": page.url}
+
         except Exception as e:
             logger.error(f"Login error: {e}")
+            self._forget_auth(session, auth_key)
             return {"success": False, "error": str(e)}
 
+    def _forget_auth(self, session: PlaywrightSession, auth_key: Optional[bytes]):
+        """Descarta o estado autenticado salvo e desmarca a sessão."""
+        if auth_key is not None:
+            self._auth_states.pop(auth_key, None)
+        session.auth_key = None
+        session.logged_in = False
+        session.user = None
+
     async def search_process(self, session_id: str, query: str, search_type: str = "numero") -> dict:
         """Busca processos no SEI."""
         if session_id not in self.sessions:
@@ -408,31 +772,29 @@ class PlaywrightManager:
         page = session.page
 
         # Cache check
-        cache_key = f"search:{search_type}:{query}"
-        cached = self._get_cached(session, cache_key)
+        cache_key = self._cache_key(search_type, query)
+        cached = self._get_cached(session, CacheTag.SEARCH, cache_key)
         if cached is not None:
             return cached
 
         try:
             # Navegar para pesquisa (fail-fast + self-healing)
-            await smart_click(page, 'a:has-text("Pesquisa"), #lnkPesquisar', context="search:nav")
-            await page.wait_for_load_state('domcontentloaded')
+            await self._cached_probe(session, smart_click, 'a:has-text("Pesquisa"), #lnkPesquisar', context="search:nav")
 
             # Preencher busca
-            if await smart_fill(page, 'input[name="txtPesquisa"], #txtPesquisaRapida', query, context="search:input"):
+            if await self._cached_probe(session, smart_fill, 'input[name="txtPesquisa"], #txtPesquisaRapida', query, context="search:input"):
                 await page.keyboard.press('Enter')
                 await page.wait_for_load_state('domcontentloaded')
+                self._dom_changed(session)
 
-            # Coletar resultados
-            results = await page.query_selector_all('tr.processoVisitado, tr.processoNaoVisitado, .processo')
-
-            processes = []
-            for result in results[:10]:
-                text = await result.inner_text()
-                processes.append({"text": text.strip()})
+            # Coletar resultados (um único round-trip CDP)
+            rows = await page.locator(
+                'tr.processoVisitado, tr.processoNaoVisitado, .processo'
+            ).evaluate_all(_JS_ROW_LINKS, 10)
+            processes = [{"text": row["text"], "href": row["href"]} for row in rows]
 
             result = {"success": True, "results": processes, "count": len(processes)}
-            self._set_cache(session, cache_key, result, ttl_s=30.0)
+            self._set_cache(session, CacheTag.SEARCH, cache_key, result, ttl_s=30.0)
             return result
 
         except Exception as e:
@@ -448,8 +810,10 @@ class PlaywrightManager:
         page = session.page
 
         try:
+            # Screenshot precisa de imagens: desliga light mode para as próximas navegações
+            await self._set_light_mode(session, False)
             screenshot_bytes = await page.screenshot(full_page=full_page)
-            base64_image = base64.b64encode(screenshot_bytes).decode('utf-8')
+            base64_image = b64encode_str(screenshot_bytes)
 
             return {
                 "success": True,
@@ -491,18 +855,21 @@ class PlaywrightManager:
 
         try:
             # Método 1: Pesquisa rápida no topo (fail-fast + self-healing)
-            if await smart_fill(page, '#txtPesquisaRapida, input[name="txtPesquisaRapida"]', process_number, context="open_process:pesquisa_rapida"):
+            if await self._cached_probe(session, smart_fill, '#txtPesquisaRapida, input[name="txtPesquisaRapida"]', process_number, context="open_process:pesquisa_rapida"):
                 await page.keyboard.press('Enter')
-                await page.wait_for_load_state('domcontentloaded')
 
-                # Verificar se encontrou
-                current_url = page.url
-                if 'processo_visualizar' in current_url or 'processo' in current_url.lower():
-                    return {"success": True, "message": f"Processo {process_number} aberto", "url": current_url}
+                # Verificar se encontrou (retorna assim que a URL do processo aparece)
+                try:
+                    await page.wait_for_url(_RE_PROCESS_URL, timeout=5000)
+                    self._invalidate_cache(session, CacheTag.SNAP)
+                    return {"success": True, "message": f"Processo {process_number} aberto", "url": page.url}
+                except PlaywrightTimeoutError:
+                    pass
 
             # Método 2: Clicar no link do processo se listado
-            if await smart_click(page, f'a:has-text("{process_number}")', context="open_process:link"):
+            if await self._cached_probe(session, smart_click, f'a:has-text("{process_number}")', context="open_process:link"):
                 await page.wait_for_load_state('domcontentloaded')
+                self._invalidate_cache(session, CacheTag.SNAP)
                 return {"success": True, "message": f"Processo {process_number} aberto", "url": page.url}
 
             return {"success": False, "error": f"Processo {process_number} não encontrado"}
@@ -520,8 +887,8 @@ class PlaywrightManager:
         page = session.page
 
         # Cache check
-        cache_key = f"list_docs:{process_number or 'current'}"
-        cached = self._get_cached(session, cache_key)
+        cache_key = self._cache_key(process_number or 'current')
+        cached = self._get_cached(session, CacheTag.LIST_DOCS, cache_key)
         if cached is not None:
             return cached
 
@@ -532,35 +899,32 @@ class PlaywrightManager:
                 if not open_result.get("success"):
                     return open_result
 
-            # Coletar documentos da árvore de processos
-            doc_elements = await page.query_selector_all(
+            # Coletar documentos da árvore de processos (um único round-trip CDP)
+            doc_elements = await page.locator(
                 '#divArvore a.arvoreNo, .arvore-documento, tr[class*="documento"], .infraArvoreNo'
-            )
+            ).evaluate_all(_JS_DOC_LINKS)
 
             documents = []
             for elem in doc_elements:
-                try:
-                    text = await elem.inner_text()
-                    href = await elem.get_attribute('href') or ''
-                    doc_id = ''
-
-                    # Extrair ID do documento do href
-                    if 'id_documento=' in href:
-                        doc_id = href.split('id_documento=')[1].split('&')[0]
-                    elif 'documento_visualizar' in href:
-                        doc_id = href.split('/')[-1].split('?')[0]
-
-                    if text.strip():
-                        documents.append({
-                            "name": text.strip(),
-                            "id": doc_id,
-                            "href": href
-                        })
-                except:
-                    continue
+                text = elem["text"]
+                href = elem["href"]
+                doc_id = ''
+
+                # Extrair ID do documento do href
+                if 'id_documento=' in href:
+                    doc_id = href.split('id_documento=')[1].split('&')[0]
+                elif 'documento_visualizar' in href:
+                    doc_id = href.split('/')[-1].split('?')[0]
+
+                if text:
+                    documents.append({
+                        "name": text,
+                        "id": doc_id,
+                        "href": href
+                    })
 
             result = {"success": True, "documents": documents, "count": len(documents)}
-            self._set_cache(session, cache_key, result, ttl_s=60.0)
+            self._set_cache(session, CacheTag.LIST_DOCS, cache_key, result, ttl_s=60.0)
             return result
 
         except Exception as e:
@@ -576,8 +940,8 @@ class PlaywrightManager:
         page = session.page
 
         # Cache check
-        cache_key = f"status:{process_number or 'current'}:{include_history}"
-        cached = self._get_cached(session, cache_key)
+        cache_key = self._cache_key(process_number or 'current', include_history)
+        cached = self._get_cached(session, CacheTag.STATUS, cache_key)
         if cached is not None:
             return cached
 
@@ -589,25 +953,20 @@ class PlaywrightManager:
                     return open_result
 
             # Clicar em "Consultar Andamento" ou aba similar (fail-fast + self-healing)
-            if await smart_click(page, 'a:has-text("Consultar Andamento"), a:has-text("Andamento"), #lnkAndamento', context="get_status:andamento"):
+            if await self._cached_probe(session, smart_click, 'a:has-text("Consultar Andamento"), a:has-text("Andamento"), #lnkAndamento', context="get_status:andamento"):
                 await page.wait_for_load_state('domcontentloaded')
+                self._invalidate_cache(session, CacheTag.SNAP)
 
             # Coletar histórico
             history = []
             if include_history:
-                history_rows = await page.query_selector_all(
+                texts = await page.locator(
                     'table.infraTable tr, #tblHistorico tr, .historico-item'
-                )
-                for row in history_rows[:20]:  # Limitar a 20 entradas
-                    try:
-                        text = await row.inner_text()
-                        if text.strip():
-                            history.append({"entry": text.strip()})
-                    except:
-                        continue
+                ).evaluate_all(_JS_INNER_TEXTS, 20)  # Limitar a 20 entradas
+                history = [{"entry": text} for text in texts if text]
 
             # Tentar extrair status atual (fail-fast + self-healing)
-            status_elem = await smart_query(page, '.status-processo, #spanStatus, .situacao', context="get_status:status_elem")
+            status_elem = await self._cached_probe(session, smart_query, '.status-processo, #spanStatus, .situacao', context="get_status:status_elem")
             status = ""
             if status_elem:
                 status = await status_elem.inner_text()
@@ -619,7 +978,7 @@ class PlaywrightManager:
                 "history": history,
                 "history_count": len(history)
             }
-            self._set_cache(session, cache_key, result, ttl_s=30.0)
+            self._set_cache(session, CacheTag.STATUS, cache_key, result, ttl_s=30.0)
             return result
 
         except Exception as e:
@@ -637,7 +996,8 @@ class PlaywrightManager:
         page = session.page
 
         # Invalidar cache (operação de escrita)
-        self._invalidate_cache(session, "list_docs:")
+        self._invalidate_cache(session, CacheTag.LIST_DOCS)
+        self._invalidate_cache(session, CacheTag.SNAP)
 
         try:
             # Abre o processo somente se necessário
@@ -646,37 +1006,36 @@ class PlaywrightManager:
                 return open_result
 
             # Clicar em "Incluir Documento" (fail-fast + self-healing)
-            if not await smart_click(page, 'a:has-text("Incluir Documento"), #lnkIncluirDocumento, img[title*="Incluir Documento"]', context="create_doc:incluir"):
+            if not await self._cached_probe(session, smart_click, 'a:has-text("Incluir Documento"), #lnkIncluirDocumento, img[title*="Incluir Documento"]', context="create_doc:incluir"):
                 return {"success": False, "error": "Botão 'Incluir Documento' não encontrado"}
 
-            await page.wait_for_load_state('domcontentloaded')
-
             # Selecionar tipo de documento (fail-fast + self-healing)
-            type_input = await smart_query(page, '#txtFiltro, input[name="txtFiltro"], #selTipoDocumento', context="create_doc:tipo")
+            type_input = await self._cached_probe(session, smart_query, '#txtFiltro, input[name="txtFiltro"], #selTipoDocumento', context="create_doc:tipo")
             if type_input:
                 tag_name = await type_input.evaluate('el => el.tagName.toLowerCase()')
                 if tag_name == 'input':
                     await type_input.fill(document_type)
+                    self._dom_changed(session)
                     await asyncio.sleep(0.5)
                     # Clicar no resultado da busca
-                    await smart_click(page, f'a:has-text("{document_type}"), li:has-text("{document_type}")', context="create_doc:tipo_option")
+                    await self._cached_probe(session, smart_click, f'a:has-text("{document_type}"), li:has-text("{document_type}")', context="create_doc:tipo_option")
                 else:
                     await page.select_option('#txtFiltro, input[name="txtFiltro"], #selTipoDocumento', label=document_type)
-
-            await page.wait_for_load_state('domcontentloaded')
+                    self._dom_changed(session)
 
             # Preencher descrição se informada
             if description:
-                await smart_fill(page, '#txtDescricao, input[name="txtDescricao"], textarea[name="txtDescricao"]', description, context="create_doc:descricao")
+                await self._cached_probe(session, smart_fill, '#txtDescricao, input[name="txtDescricao"], textarea[name="txtDescricao"]', description, context="create_doc:descricao")
 
             # Selecionar nível de acesso
             nivel_map = {"publico": "0", "restrito": "1", "sigiloso": "2"}
             nivel_value = nivel_map.get(nivel_acesso.lower(), "0")
-            await smart_click(page, f'input[name="staNivelAcesso"][value="{nivel_value}"]', context="create_doc:nivel_acesso")
+            await self._cached_probe(session, smart_click, f'input[name="staNivelAcesso"][value="{nivel_value}"]', context="create_doc:nivel_acesso")
 
-            # Salvar/Confirmar
-            if await smart_click(page, 'button[type="submit"], input[type="submit"], #btnSalvar, #btnConfirmar', context="create_doc:salvar"):
+            # Salvar/Confirmar (page.url abaixo não tem auto-wait: espera a navegação)
+            if await self._cached_probe(session, smart_click, 'button[type="submit"], input[type="submit"], #btnSalvar, #btnConfirmar', context="create_doc:salvar"):
                 await page.wait_for_load_state('domcontentloaded')
+                self._invalidate_cache(session, CacheTag.SNAP)
 
             # Verificar se criou
             current_url = page.url
@@ -693,6 +1052,7 @@ class PlaywrightManager:
                         textarea = await page.query_selector('textarea#txtAreaEditor, textarea.editor')
                         if textarea:
                             await textarea.fill(content)
+                    self._dom_changed(session)
 
                 return {"success": True, "message": f"Documento {document_type} criado", "url": current_url}
 
@@ -708,34 +1068,32 @@ class PlaywrightManager:
             return {"success": False, "error": "Sessão não encontrada"}
 
         session = self.sessions[session_id]
-        page = session.page
+
+        # Invalidar cache (operação de escrita)
+        self._invalidate_cache(session, CacheTag.SNAP)
 
         try:
             # Navegar para o documento se tiver ID (fail-fast + self-healing)
             if document_id:
-                if await smart_click(page, f'a[href*="id_documento={document_id}"]', context="sign_doc:nav"):
-                    await page.wait_for_load_state('domcontentloaded')
+                await self._cached_probe(session, smart_click, f'a[href*="id_documento={document_id}"]', context="sign_doc:nav")
 
             # Clicar em "Assinar"
-            if not await smart_click(page, 'a:has-text("Assinar"), img[title*="Assinar"], #btnAssinar, button:has-text("Assinar")', context="sign_doc:assinar"):
+            if not await self._cached_probe(session, smart_click, 'a:has-text("Assinar"), img[title*="Assinar"], #btnAssinar, button:has-text("Assinar")', context="sign_doc:assinar"):
                 return {"success": False, "error": "Botão de assinatura não encontrado"}
 
-            await page.wait_for_load_state('domcontentloaded')
-
             # Preencher senha
-            await smart_fill(page, 'input[type="password"], #pwdSenha, input[name="pwdSenha"]', password, context="sign_doc:senha")
+            await self._cached_probe(session, smart_fill, 'input[type="password"], #pwdSenha, input[name="pwdSenha"]', password, context="sign_doc:senha")
 
             # Confirmar assinatura
-            if await smart_click(page, 'button[type="submit"]:has-text("Assinar"), #btnConfirmar, input[value="Assinar"]', context="sign_doc:confirmar"):
-                await page.wait_for_load_state('domcontentloaded')
+            await self._cached_probe(session, smart_click, 'button[type="submit"]:has-text("Assinar"), #btnConfirmar, input[value="Assinar"]', context="sign_doc:confirmar")
 
             # Verificar sucesso
-            success_msg = await smart_query(page, '.alert-success, .mensagem-sucesso, :has-text("assinado com sucesso")', context="sign_doc:success_msg")
+            success_msg = await self._cached_probe(session, smart_query, '.alert-success, .mensagem-sucesso, :has-text("assinado com sucesso")', context="sign_doc:success_msg")
             if success_msg:
                 return {"success": True, "message": "Documento assinado com sucesso"}
 
             # Verificar erro
-            error_msg = await smart_query(page, '.alert-danger, .mensagem-erro, .infraException', context="sign_doc:error_msg")
+            error_msg = await self._cached_probe(session, smart_query, '.alert-danger, .mensagem-erro, .infraException', context="sign_doc:error_msg")
             if error_msg:
                 error_text = await error_msg.inner_text()
                 return {"success": False, "error": error_text.strip()}
@@ -765,34 +1123,35 @@ class PlaywrightManager:
                 return open_result
 
             # Clicar em "Enviar Processo" (fail-fast + self-healing)
-            if not await smart_click(page, 'a:has-text("Enviar Processo"), img[title*="Enviar"], #lnkEnviarProcesso', context="forward:enviar"):
+            if not await self._cached_probe(session, smart_click, 'a:has-text("Enviar Processo"), img[title*="Enviar"], #lnkEnviarProcesso', context="forward:enviar"):
                 return {"success": False, "error": "Botão 'Enviar Processo' não encontrado"}
 
-            await page.wait_for_load_state('domcontentloaded')
-
             # Selecionar unidade destino
-            unit_input = await smart_query(page, '#txtUnidade, input[name="txtUnidade"], #selUnidadesDestino', context="forward:unidade")
+            unit_input = await self._cached_probe(session, smart_query, '#txtUnidade, input[name="txtUnidade"], #selUnidadesDestino', context="forward:unidade")
             if unit_input:
                 tag_name = await unit_input.evaluate('el => el.tagName.toLowerCase()')
                 if tag_name == 'input':
                     await unit_input.fill(target_unit)
+                    self._dom_changed(session)
                     await asyncio.sleep(0.5)
                     # Clicar na sugestão
-                    await smart_click(page, f'.autocomplete-suggestion:has-text("{target_unit}"), li:has-text("{target_unit}")', context="forward:sugestao")
+                    await self._cached_probe(session, smart_click, f'.autocomplete-suggestion:has-text("{target_unit}"), li:has-text("{target_unit}")', context="forward:sugestao")
                 else:
                     await page.select_option('#txtUnidade, input[name="txtUnidade"], #selUnidadesDestino', label=target_unit)
+                    self._dom_changed(session)
 
             # Manter aberto na unidade atual
             if keep_open:
-                await smart_click(page, '#chkManterAberto, input[name="chkManterAberto"]', context="forward:manter_aberto")
+                await self._cached_probe(session, smart_click, '#chkManterAberto, input[name="chkManterAberto"]', context="forward:manter_aberto")
 
             # Adicionar observação
             if note:
-                await smart_fill(page, '#txtObservacao, textarea[name="txtObservacao"]', note, context="forward:observacao")
+                await self._cached_probe(session, smart_fill, '#txtObservacao, textarea[name="txtObservacao"]', note, context="forward:observacao")
 
             # Enviar
-            if await smart_click(page, 'button[type="submit"], #btnEnviar, input[value="Enviar"]', context="forward:submit"):
+            if await self._cached_probe(session, smart_click, 'button[type="submit"], #btnEnviar, input[value="Enviar"]', context="forward:submit"):
                 await page.wait_for_load_state('domcontentloaded')
+                self._invalidate_cache(session, CacheTag.SNAP)
 
             return {"success": True, "message": f"Processo tramitado para {target_unit}"}
 
@@ -810,7 +1169,6 @@ class PlaywrightManager:
 
         try:
             await page.goto(url, wait_until='domcontentloaded')
-            await page.wait_for_load_state('domcontentloaded')
 
             return {
                 "success": True,
@@ -831,6 +1189,7 @@ class PlaywrightManager:
         try:
             if await smart_click(page, selector, context=f"click:{selector[:30]}"):
                 await page.wait_for_load_state('domcontentloaded')
+                self._invalidate_cache(session, CacheTag.SNAP)
                 return {"success": True, "message": f"Clicado em {selector}"}
             return {"success": False, "error": f"Elemento não encontrado: {selector}"}
         except Exception as e:
@@ -846,6 +1205,7 @@ class PlaywrightManager:
 
         try:
             if await smart_fill(page, selector, value, context=f"fill:{selector[:30]}"):
+                self._invalidate_cache(session, CacheTag.SNAP)
                 return {"success": True, "message": f"Campo {selector} preenchido"}
             return {"success": False, "error": f"Campo não encontrado: {selector}"}
         except Exception as e:
@@ -861,11 +1221,12 @@ class PlaywrightManager:
 
         try:
             # Clicar em sair (fail-fast + self-healing)
-            if await smart_click(page, 'a:has-text("Sair"), #lnkSair, a[href*="logout"], img[title*="Sair"]', context="logout:sair"):
+            if await self._cached_probe(session, smart_click, 'a:has-text("Sair"), #lnkSair, a[href*="logout"], img[title*="Sair"]', context="logout:sair"):
                 await page.wait_for_load_state('domcontentloaded')
+                self._invalidate_cache(session, CacheTag.SNAP)
 
-            session.logged_in = False
-            session.user = None
+            # Logout invalida os cookies salvos para estas credenciais
+            self._forget_auth(session, session.auth_key)
 
             return {"success": True, "message": "Logout realizado"}
 
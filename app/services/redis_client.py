@@ -0,0 +1,43 @@
+"""
+Shared Redis client for caches and deduplication
+
+Cliente lazy e opcional: sem a lib redis ou com o servidor fora do ar,
+get_redis() retorna None e os chamadores seguem sem cache.
+"""
+import time
+
+import structlog
+
+from app.config import settings
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+logger = structlog.get_logger()
+
+# Apos uma falha de conexao, espera antes de tentar de novo (evita ping a cada request)
+REDIS_RETRY_INTERVAL_S = 30.0
+
+_client = None
+_retry_at = 0.0
+
+
+async def get_redis():
+    """Retorna o cliente Redis compartilhado, ou None se indisponivel."""
+    global _client, _retry_at
+    if _client is not None:
+        return _client
+    if aioredis is None or time.monotonic() < _retry_at:
+        return None
+    try:
+        client = aioredis.from_url(settings.redis_url, decode_responses=True)
+        await client.ping()
+    except Exception as e:
+        _retry_at = time.monotonic() + REDIS_RETRY_INTERVAL_S
+        logger.warning("redis_unavailable", error=str(e))
+        return None
+    _client = client
+    logger.info("redis_connected")
+    return _client
@@ -10,15 +10,61 @@ Camada de resiliência para automação Playwright do SEI.
 
 import asyncio
 import base64
+import hashlib
+import heapq
 import json
 import logging
 import os
+import re
 import time
+from collections import OrderedDict, defaultdict
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
+from weakref import WeakKeyDictionary
 
 logger = logging.getLogger(__name__)
 
+# orjson é opcional (encoder em C, bem mais rápido); fallback para json da stdlib
+try:
+    import orjson
+
+    def _dumps(obj: Any, indent: bool = False) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+
+    _loads = orjson.loads
+except ImportError:
+    orjson = None
+
+    def _dumps(obj: Any, indent: bool = False) -> bytes:
+        return json.dumps(obj, indent=2 if indent else None).encode()
+
+    _loads = json.loads
+
+# pybase64 é opcional (base64 com SIMD); fallback para base64 da stdlib
+try:
+    import pybase64
+
+    def b64encode_str(data: bytes) -> str:
+        return pybase64.b64encode_as_string(data)
+except ImportError:
+    pybase64 = None
+
+    def b64encode_str(data: bytes) -> str:
+        return base64.b64encode(data).decode()
+
+# xxhash é opcional (hash não-criptográfico rápido); fallback para blake2b
+try:
+    import xxhash
+
+    def _fingerprint(data: bytes) -> str:
+        return xxhash.xxh64_hexdigest(data)
+except ImportError:
+    xxhash = None
+
+    def _fingerprint(data: bytes) -> str:
+        return hashlib.blake2b(data, digest_size=8).hexdigest()
+
 # ============================================
 # Configuração
 # ============================================
@@ -33,10 +79,17 @@ AGENT_FALLBACK_ENABLED = os.environ.get("AGENT_FALLBACK_ENABLED", "false").lower
 ANTHROPIC_API_KEY = os.environ.get("ANTHROPIC_API_KEY", "")
 AGENT_MODEL = os.environ.get("AGENT_FALLBACK_MODEL", "claude-sonnet-4-20250514")
 
+# Extração do seletor na resposta do agent
+_SELECTOR_RE = re.compile(r"SELECTOR:\s*(.+)", re.IGNORECASE)
+
 STORE_PATH = Path(os.environ.get(
     "SELECTOR_STORE_PATH",
     os.path.expanduser("~/.sei-mcp/selector-cache.json")
 ))
+STORE_MAX_ENTRIES = int(os.environ.get("SELECTOR_STORE_MAX", "5000"))
+STORE_FLUSH_DELAY_S = 2.0
+STORE_WAL_MAX_BYTES = 1024 * 1024  # compacta o WAL no snapshot acima de 1 MB
+STORE_MERGE_INTERVAL_S = 5.0  # agrega record_success antes de aplicar no cache
 
 
 # ============================================
@@ -44,34 +97,110 @@ STORE_PATH = Path(os.environ.get(
 # ============================================
 
 class SelectorStore:
-    """Persiste seletores CSS descobertos pelo agent para reutilização."""
+    """Persiste seletores CSS descobertos pelo agent para reutilização.
 
-    def __init__(self, path: Path = STORE_PATH):
+    LRU limitado a STORE_MAX_ENTRIES. Cada mutação é anexada a um WAL jsonl
+    (O(entrada)); o snapshot completo (tmp + os.replace) só é regravado quando
+    o WAL passa de STORE_WAL_MAX_BYTES ou no prune(), com debounce.
+    Sucessos são acumulados em buffer e aplicados a cada STORE_MERGE_INTERVAL_S.
+    """
+
+    def __init__(self, path: Path = STORE_PATH, max_entries: int = STORE_MAX_ENTRIES):
         self.path = path
-        self._cache: Dict[str, dict] = {}
+        self._wal = path.with_suffix(".wal")
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, dict]" = OrderedDict()
         self._dirty = False
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._pending_successes: Dict[str, int] = defaultdict(int)
+        self._pending_ts: Dict[str, float] = {}
+        self._merge_handle: Optional[asyncio.TimerHandle] = None
+        # Min-heap (last_success, key) para o prune; entradas velhas são toleradas
+        # (o dict é a fonte de verdade) e o heap é reconstruído se inchar demais
+        self._expiry: List[Tuple[float, str]] = []
         self._load()
 
     def _load(self):
         try:
             if self.path.exists():
-                self._cache = json.loads(self.path.read_text())
+                self._cache = OrderedDict(_loads(self.path.read_bytes()))
         except Exception:
-            self._cache = {}
+            self._cache = OrderedDict()
+        # Replay do WAL sobre o snapshot
+        try:
+            if self._wal.exists():
+                for line in self._wal.read_bytes().splitlines():
+                    try:
+                        record = _loads(line)
+                    except ValueError:
+                        continue  # linha truncada (crash no meio do append)
+                    if record.get("e") is None:
+                        self._cache.pop(record["k"], None)
+                    else:
+                        self._cache[record["k"]] = record["e"]
+                        self._cache.move_to_end(record["k"])
+        except Exception:
+            pass
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        self._rebuild_expiry()
+
+    def _rebuild_expiry(self):
+        self._expiry = [(v.get("last_success", 0), k) for k, v in self._cache.items()]
+        heapq.heapify(self._expiry)
+
+    def _track(self, key: str, entry: dict):
+        heapq.heappush(self._expiry, (entry.get("last_success", 0), key))
+        if len(self._expiry) > 2 * max(len(self._cache), 64):
+            self._rebuild_expiry()
+
+    def _append_wal(self, key: str, entry: Optional[dict]):
+        try:
+            self._wal.parent.mkdir(parents=True, exist_ok=True)
+            with open(self._wal, "ab") as f:
+                f.write(_dumps({"k": key, "e": entry}) + b"\n")
+                size = f.tell()
+        except Exception:
+            return  # best-effort
+        if size > STORE_WAL_MAX_BYTES:
+            self._schedule_save()
 
     def _save(self):
+        self._merge_pending()
         if not self._dirty:
             return
         try:
             self.path.parent.mkdir(parents=True, exist_ok=True)
-            self.path.write_text(json.dumps(self._cache, indent=2))
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            tmp.write_bytes(_dumps(dict(self._cache), indent=True))  # preserva a ordem LRU
+            os.replace(tmp, self.path)
+            self._wal.unlink(missing_ok=True)
             self._dirty = False
         except Exception:
             pass  # best-effort
 
+    def _flush(self):
+        self._flush_handle = None
+        self._save()
+
+    def _schedule_save(self):
+        """Agenda gravação com debounce; sem event loop rodando, grava na hora."""
+        self._dirty = True
+        if self._flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._save()
+            return
+        self._flush_handle = loop.call_later(STORE_FLUSH_DELAY_S, self._flush)
+
     def get(self, key: str) -> Optional[str]:
         entry = self._cache.get(key)
-        return entry["selector"] if entry else None
+        if not entry:
+            return None
+        self._cache.move_to_end(key)
+        return entry["selector"]
 
     def set(self, key: str, selector: str):
         now = time.time()
@@ -82,31 +211,59 @@ class SelectorStore:
             "success_count": existing.get("success_count", 0),
             "last_success": now,
         }
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
         self._dirty = True
-        self._save()
+        self._track(key, self._cache[key])
+        self._append_wal(key, self._cache[key])
 
     def record_success(self, key: str):
-        entry = self._cache.get(key)
-        if not entry:
+        self._pending_successes[key] += 1
+        self._pending_ts[key] = time.time()
+        if self._merge_handle is not None:
             return
-        entry["success_count"] = entry.get("success_count", 0) + 1
-        entry["last_success"] = time.time()
-        self._dirty = True
-        # Debounce save — não salva a cada hit
-        # (será salvo no próximo set() ou prune())
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._merge_pending()
+            return
+        self._merge_handle = loop.call_later(STORE_MERGE_INTERVAL_S, self._merge_pending)
+
+    def _merge_pending(self):
+        """Aplica os sucessos acumulados: uma escrita no WAL por chave, não por chamada."""
+        if self._merge_handle is not None:
+            self._merge_handle.cancel()
+            self._merge_handle = None
+        if not self._pending_successes:
+            return
+        pending, self._pending_successes = self._pending_successes, defaultdict(int)
+        stamps, self._pending_ts = self._pending_ts, {}
+        for key, count in pending.items():
+            entry = self._cache.get(key)
+            if not entry:
+                continue
+            entry["success_count"] = entry.get("success_count", 0) + count
+            entry["last_success"] = stamps[key]
+            self._cache.move_to_end(key)
+            self._dirty = True
+            self._track(key, entry)
+            self._append_wal(key, entry)
 
     def prune(self, max_age_days: int = 30):
+        self._merge_pending()
         cutoff = time.time() - (max_age_days * 86400)
-        to_remove = [
-            k for k, v in self._cache.items()
-            if v.get("last_success", 0) < cutoff
-        ]
-        for k in to_remove:
-            del self._cache[k]
-        if to_remove:
-            self._dirty = True
-            self._save()
-        return len(to_remove)
+        removed = 0
+        # Só visita entradas expiradas (O(k log n)), não o cache inteiro
+        while self._expiry and self._expiry[0][0] < cutoff:
+            ts, k = heapq.heappop(self._expiry)
+            entry = self._cache.get(k)
+            if entry is not None and entry.get("last_success", 0) == ts:
+                del self._cache[k]
+                removed += 1
+        if removed:
+            self._schedule_save()
+        return removed
 
     @property
     def size(self) -> int:
@@ -126,6 +283,126 @@ async def fail_fast(coro, timeout_s: float = FAIL_FAST_TIMEOUT_MS / 1000):
     return await asyncio.wait_for(coro, timeout=timeout_s)
 
 
+# ============================================
+# Locator cache (por página)
+# ============================================
+
+LOCATOR_CACHE_MAX_PER_PAGE = 512
+
+# Page -> {selectors: Locator}. Entradas somem junto com a página (weakref).
+_locator_cache: "WeakKeyDictionary[Any, Dict[str, Any]]" = WeakKeyDictionary()
+
+
+def _get_locator(page, selectors: str):
+    """Retorna page.locator(selectors), reaproveitando o Locator já criado para a página."""
+    locators = _locator_cache.get(page)
+    if locators is None:
+        locators = _locator_cache[page] = {}
+    loc = locators.get(selectors)
+    if loc is None:
+        if len(locators) >= LOCATOR_CACHE_MAX_PER_PAGE:
+            del locators[next(iter(locators))]  # FIFO
+        loc = locators[selectors] = page.locator(selectors).first
+    return loc
+
+
+def invalidate_page_cache(page) -> None:
+    """Descarta os Locators cacheados da página (chamar em navegação/fechamento)."""
+    _locator_cache.pop(page, None)
+
+
+async def _wait_visible(page, selectors: str, timeout_ms: int) -> Optional[Any]:
+    """Aguarda o primeiro elemento visível via Locator e retorna seu ElementHandle."""
+    loc = _get_locator(page, selectors)
+    await loc.wait_for(state="visible", timeout=timeout_ms)
+    return await loc.element_handle()
+
+
+@lru_cache(maxsize=4096)
+def _store_key(context: str, selectors: str) -> str:
+    """Chave do SelectorStore: hash do contexto + seletor completo (sem truncar)."""
+    return "sei|" + _fingerprint(f"{context}|{selectors}".encode())
+
+
+@lru_cache(maxsize=1024)
+def _split_selector_groups(selectors: str) -> Tuple[str, ...]:
+    """Divide 'a, b:has-text("x, y"), c' nos grupos do topo (respeita aspas, () e [])."""
+    groups = []
+    depth = 0
+    quote = None
+    start = 0
+    for i, ch in enumerate(selectors):
+        if quote:
+            if ch == quote and selectors[i - 1] != "\\":
+                quote = None
+        elif ch in "\"'":
+            quote = ch
+        elif ch in "([":
+            depth += 1
+        elif ch in ")]":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            groups.append(selectors[start:i].strip())
+            start = i + 1
+    groups.append(selectors[start:].strip())
+    return tuple(g for g in groups if g)
+
+
+# Testa todos os grupos num único evaluate; sintaxe só do Playwright (:has-text etc.)
+# lança no querySelector e é ignorada — esses grupos ficam para o race via Locator.
+_MULTI_QUERY_JS = """(sels) => {
+    for (const s of sels) {
+        let e = null;
+        try { e = document.querySelector(s); } catch (err) { continue; }
+        if (e && e.getClientRects().length && getComputedStyle(e).visibility !== 'hidden') return e;
+    }
+    return null;
+}"""
+
+
+async def _query_visible_now(page, groups: Tuple[str, ...]) -> Optional[Any]:
+    """Fast path: primeiro grupo já visível, em um round-trip CDP (sem esperar)."""
+    try:
+        handle = await page.evaluate_handle(_MULTI_QUERY_JS, list(groups))
+    except Exception:
+        return None
+    el = handle.as_element()
+    if el is None:
+        await handle.dispose()
+    return el
+
+
+async def _wait_visible_any(page, selectors: str, timeout_ms: int) -> Optional[Any]:
+    """Como _wait_visible, mas corre os grupos da lista em paralelo e fica com o primeiro visível.
+
+    Um '#id' barato não espera por um ':has-text(...)' lento à sua esquerda.
+    Antes do race, checa todos os grupos de uma vez no browser (_query_visible_now).
+    """
+    groups = _split_selector_groups(selectors)
+    el = await _query_visible_now(page, groups)
+    if el is not None:
+        return el
+    if len(groups) <= 1:
+        return await _wait_visible(page, selectors, timeout_ms)
+
+    pending = {asyncio.ensure_future(_wait_visible(page, g, timeout_ms)) for g in groups}
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = task.exception()
+                elif task.result():
+                    return task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+    if error is not None:
+        raise error
+    return None
+
+
 # ============================================
 # Smart Helpers — Playwright com resiliência
 # ============================================
@@ -144,24 +421,12 @@ async def smart_query(page, selectors: str, context: str = "default",
         context: Chave de contexto para o store (ex: "login:usuario")
         timeout_ms: Timeout fail-fast em ms
     """
-    store_key = f"sei|{context}|{selectors[:50]}"
-    timeout_s = timeout_ms / 1000
+    store_key = _store_key(context, selectors)
 
-    # 1. Seletores CSS originais (fail-fast)
+    # 1. Seletores CSS originais (fail-fast): uma única espera até ficar visível
+    #    (query_selector prévio foi removido — não checava visibilidade e custava um RPC a mais)
     try:
-        el = await fail_fast(
-            page.query_selector(selectors),
-            timeout_s
-        )
-        if el:
-            selector_store.record_success(store_key)
-            return el
-    except (asyncio.TimeoutError, Exception):
-        pass
-
-    # Espera curta e tenta com wait_for_selector
-    try:
-        el = await page.wait_for_selector(selectors, timeout=timeout_ms, state="visible")
+        el = await _wait_visible_any(page, selectors, timeout_ms)
         if el:
             selector_store.record_success(store_key)
             return el
@@ -172,7 +437,7 @@ async def smart_query(page, selectors: str, context: str = "default",
     cached = selector_store.get(store_key)
     if cached:
         try:
-            el = await page.wait_for_selector(cached, timeout=timeout_ms, state="visible")
+            el = await _wait_visible_any(page, cached, timeout_ms)
             if el:
                 selector_store.record_success(store_key)
                 logger.info(f"[SELF-HEALING] Usando seletor do cache: {cached}")
@@ -239,44 +504,69 @@ async def smart_select(page, selectors: str, label: str = None, value: str = Non
 # Agent Fallback (Claude API)
 # ============================================
 
+# DOM simplificado (só elementos interativos visíveis) enviado ao agent
+# Ordem do documento e limite por nº de nós (não por caracteres): todos os tipos
+# de elemento entram, e nenhum atributo/linha sai cortado no meio.
+DOM_SNAP_MAX_NODES = 150
+_DOM_SNAP_JS = """() => {
+    const out = [];
+    const nodes = document.querySelectorAll('input, button, select, textarea, a, label');
+    for (let i = 0; i < nodes.length && out.length < %d; i++) {
+        const el = nodes[i];
+        if (el.offsetParent === null) continue;
+        const attrs = [];
+        for (const a of ['id', 'name', 'class', 'type', 'role', 'aria-label', 'placeholder', 'href', 'value']) {
+            const v = el.getAttribute(a);
+            if (v) attrs.push(a + '="' + v.substring(0, 80) + '"');
+        }
+        const text = (el.textContent || '').trim().substring(0, 60);
+        out.push('<' + el.tagName.toLowerCase() + ' ' + attrs.join(' ') + (text ? ' text="' + text + '"' : '') + '/>');
+    }
+    return out.join('\\n');
+}""" % DOM_SNAP_MAX_NODES
+
+# Instalado uma vez por context (add_init_script): o V8 compila o helper no document-start
+# e cada fallback só envia a chamada curta abaixo
+DOM_SNAP_INIT_SCRIPT = f"window.__seiDomSnap = {_DOM_SNAP_JS};"
+_DOM_SNAP_CALL_JS = "() => window.__seiDomSnap ? window.__seiDomSnap() : null"
+
+
+# Cliente async único: não bloqueia o event loop e reaproveita o pool HTTP entre fallbacks
+_anthropic_client = None
+
+
+def _get_anthropic_client():
+    """Retorna o cliente Anthropic (criado na primeira chamada) ou None sem o SDK."""
+    global _anthropic_client
+    if _anthropic_client is None:
+        try:
+            import anthropic
+        except ImportError:
+            logger.warning("[AGENT-FALLBACK] anthropic SDK não instalado")
+            return None
+        _anthropic_client = anthropic.AsyncAnthropic(api_key=ANTHROPIC_API_KEY)
+    return _anthropic_client
+
+
 async def _agent_find_selector(page, original_selectors: str, context: str) -> Optional[str]:
     """Usa Claude API para analisar screenshot + DOM e sugerir seletor."""
-    try:
-        import anthropic
-    except ImportError:
-        logger.warning("[AGENT-FALLBACK] anthropic SDK não instalado")
+    client = _get_anthropic_client()
+    if client is None:
         return None
 
     try:
         # 1. Screenshot (JPEG, qualidade baixa para economia)
         screenshot_bytes = await page.screenshot(type="jpeg", quality=50)
-        screenshot_b64 = base64.b64encode(screenshot_bytes).decode()
+        screenshot_b64 = b64encode_str(screenshot_bytes)
 
         # 2. DOM simplificado (só elementos interativos)
-        dom_snapshot = await page.evaluate("""() => {
-            const tags = ['INPUT', 'BUTTON', 'SELECT', 'TEXTAREA', 'A', 'LABEL'];
-            const elements = [];
-            for (const tag of tags) {
-                const nodes = document.querySelectorAll(tag);
-                for (let i = 0; i < nodes.length; i++) {
-                    const el = nodes[i];
-                    if (el.offsetParent === null) continue;
-                    const attrs = [];
-                    for (const a of ['id', 'name', 'class', 'type', 'role', 'aria-label', 'placeholder', 'href', 'value']) {
-                        const v = el.getAttribute(a);
-                        if (v) attrs.push(a + '="' + v.substring(0, 80) + '"');
-                    }
-                    const text = (el.textContent || '').trim().substring(0, 60);
-                    elements.push('<' + tag.toLowerCase() + ' ' + attrs.join(' ') + (text ? ' text="' + text + '"' : '') + '/>');
-                }
-            }
-            return elements.join('\\n').substring(0, 5000);
-        }""")
+        dom_snapshot = await page.evaluate(_DOM_SNAP_CALL_JS)
+        if dom_snapshot is None:
+            # Página sem o init script (ex.: criada fora do PlaywrightManager)
+            dom_snapshot = await page.evaluate(_DOM_SNAP_JS)
 
         # 3. Chamar Claude
-        client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-
-        response = client.messages.create(
+        response = await client.messages.create(
             model=AGENT_MODEL,
             max_tokens=512,
             messages=[{
@@ -313,8 +603,7 @@ Retorne APENAS o seletor CSS, sem explicação. Formato: SELECTOR: <seletor>"""
         )
 
         # 4. Extrair selector
-        import re
-        match = re.search(r"SELECTOR:\s*(.+)", text, re.IGNORECASE)
+        match = _SELECTOR_RE.search(text)
         if match:
             selector = match.group(1).strip().strip("\"'`")
             # 5. Validar
@@ -340,8 +629,9 @@ async def create_agent_fallback_response(page, tool_name: str, tool_args: dict,
     captura screenshot + ARIA snapshot e retorna para Claude analisar.
     """
     try:
-        screenshot_bytes = await page.screenshot(type="png")
-        screenshot_b64 = base64.b64encode(screenshot_bytes).decode()
+        # JPEG do viewport: suficiente para análise visual e 3-5x menor que PNG
+        screenshot_bytes = await page.screenshot(type="jpeg", quality=60, full_page=False)
+        screenshot_b64 = b64encode_str(screenshot_bytes)
 
         # ARIA snapshot
         snap_data = await page.accessibility.snapshot(interesting_only=True)
@@ -365,7 +655,7 @@ async def create_agent_fallback_response(page, tool_name: str, tool_args: dict,
                 {
                     "type": "image",
                     "data": screenshot_b64,
-                    "mimeType": "image/png",
+                    "mimeType": "image/jpeg",
                 },
                 {
                     "type": "text",
@@ -386,16 +676,21 @@ async def create_agent_fallback_response(page, tool_name: str, tool_args: dict,
 
 
 def _serialize_aria(node: dict, indent: int = 0) -> str:
+    # Pré-ordem iterativa com um único join no final
     lines = []
-    prefix = "  " * indent
-    role = node.get("role", "")
-    name = node.get("name", "")
-    if name:
-        lines.append(f"{prefix}- {role} \"{name}\"")
-    elif role:
-        lines.append(f"{prefix}- {role}")
-    if node.get("value"):
-        lines.append(f'{prefix}  value: "{node["value"]}"')
-    for child in node.get("children", []):
-        lines.append(_serialize_aria(child, indent + 1))
+    stack = [(node, indent)]
+    while stack:
+        cur, depth = stack.pop()
+        prefix = "  " * depth
+        role = cur.get("role", "")
+        name = cur.get("name", "")
+        if name:
+            lines.append(f"{prefix}- {role} \"{name}\"")
+        elif role:
+            lines.append(f"{prefix}- {role}")
+        if cur.get("value"):
+            lines.append(f'{prefix}  value: "{cur["value"]}"')
+        children = cur.get("children")
+        if children:
+            stack.extend((child, depth + 1) for child in reversed(children))
     return "\n".join(lines)
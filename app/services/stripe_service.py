@@ -7,43 +7,87 @@ Planos ativos:
 - PRO: 49.90 BRL/mes, operacoes ilimitadas
 - ENTERPRISE: 99.90 BRL/mes, operacoes ilimitadas + suporte dedicado
 """
+import asyncio
 import stripe
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime
+from functools import lru_cache
+from types import MappingProxyType
 from typing import Any
 from enum import Enum
 
 import structlog
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# orjson e opcional (parser em C); fallback para json da stdlib
+try:
+    import orjson
+
+    _json_loads = orjson.loads
+except ImportError:
+    import json
+
+    _json_loads = json.loads
 
 from app.config import settings
 from app.models.license import PlanId, ProductType
+from app.services.license_service import LicenseService
+from app.services.redis_client import get_redis
 
 logger = structlog.get_logger()
 
 # Initialize Stripe
 stripe.api_key = settings.stripe_secret_key
 
+# Retries do proprio SDK (com idempotency key, seguros para POST)
+stripe.max_network_retries = 2
+
+# Limite de chamadas simultaneas ao Stripe: rajadas de webhooks/checkouts nao
+# estouram o rate limit (100 rps). 429 restantes ficam com os retries do SDK
+_stripe_semaphore = asyncio.Semaphore(settings.stripe_max_concurrency)
+
+
+async def stripe_call(func, *args, **kwargs):
+    """Executa uma chamada sincrona do SDK numa thread, limitada pelo semaforo."""
+    async with _stripe_semaphore:
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+
+# Pool HTTP compartilhado entre as threads do asyncio.to_thread: o pool padrao
+# do urllib3 guarda poucas conexoes e forca novo handshake TLS sob concorrencia
+STRIPE_HTTP_POOL_MAXSIZE = 32
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    _stripe_session = requests.Session()
+    _stripe_session.mount(
+        "https://",
+        HTTPAdapter(pool_connections=4, pool_maxsize=STRIPE_HTTP_POOL_MAXSIZE),
+    )
+    stripe.default_http_client = stripe.http_client.RequestsClient(
+        timeout=30,
+        session=_stripe_session,
+    )
+except ImportError:
+    pass  # sem requests o SDK usa o cliente padrao
+
 
 # ============================================================================
 # CONFIGURACAO DE PLANOS E PRECOS
 # ============================================================================
 
+@dataclass(frozen=True, slots=True)
 class PlanConfig:
     """Configuracao de um plano."""
-    def __init__(
-        self,
-        plan_id: PlanId,
-        name: str,
-        price_monthly_cents: int,
-        price_yearly_cents: int,
-        requests_per_month: int,  # -1 = ilimitado
-        features: list[str],
-    ):
-        self.plan_id = plan_id
-        self.name = name
-        self.price_monthly_cents = price_monthly_cents
-        self.price_yearly_cents = price_yearly_cents
-        self.requests_per_month = requests_per_month
-        self.features = features
+    plan_id: PlanId
+    name: str
+    price_monthly_cents: int
+    price_yearly_cents: int
+    requests_per_month: int  # -1 = ilimitado
+    features: tuple[str, ...]
 
 
 # Configuracao dos planos
@@ -54,10 +98,10 @@ PLAN_CONFIGS: dict[PlanId, PlanConfig] = {
         price_monthly_cents=0,
         price_yearly_cents=0,
         requests_per_month=5,  # 5 operacoes/dia gratuitas
-        features=[
+        features=(
             "5 operacoes/dia",
             "Acesso basico",
-        ],
+        ),
     ),
     PlanId.STARTER: PlanConfig(
         plan_id=PlanId.STARTER,
@@ -65,11 +109,11 @@ PLAN_CONFIGS: dict[PlanId, PlanConfig] = {
         price_monthly_cents=2990,  # R$ 29,90
         price_yearly_cents=29900,  # R$ 299,00 (2 meses gratis)
         requests_per_month=20,  # 20 operacoes/dia
-        features=[
+        features=(
             "20 operacoes/dia",
             "Suporte por email",
             "Atualizacoes automaticas",
-        ],
+        ),
     ),
     PlanId.PRO: PlanConfig(
         plan_id=PlanId.PRO,
@@ -77,12 +121,12 @@ PLAN_CONFIGS: dict[PlanId, PlanConfig] = {
         price_monthly_cents=4990,  # R$ 49,90
         price_yearly_cents=49900,  # R$ 499,00 (2 meses gratis)
         requests_per_month=-1,  # Ilimitado
-        features=[
+        features=(
             "Operacoes ilimitadas",
             "Suporte prioritario",
             "Acesso a todas as funcionalidades",
             "Atualizacoes prioritarias",
-        ],
+        ),
     ),
     PlanId.ENTERPRISE: PlanConfig(
         plan_id=PlanId.ENTERPRISE,
@@ -90,13 +134,13 @@ PLAN_CONFIGS: dict[PlanId, PlanConfig] = {
         price_monthly_cents=9990,  # R$ 99,90
         price_yearly_cents=99900,  # R$ 999,00 (2 meses gratis)
         requests_per_month=-1,  # Ilimitado
-        features=[
+        features=(
             "Operacoes ilimitadas",
             "Suporte dedicado",
             "SLA garantido",
             "Onboarding personalizado",
             "Acesso a todas as funcionalidades",
-        ],
+        ),
     ),
 }
 
@@ -111,7 +155,7 @@ def _get_price_id(key: str, default: str = "") -> str:
     env_key = f"STRIPE_PRICE_{key.upper()}"
     return os.getenv(env_key, default)
 
-PRICE_IDS: dict[str, dict[str, str]] = {
+_RAW_PRICE_IDS: dict[str, dict[str, str]] = {
     # Produto principal (Iudex API) - LIVE MODE
     "default": {
         "starter_monthly": _get_price_id("STARTER_MONTHLY", "price_1SttjdCvEJFyzDT1WMwiMuGp"),
@@ -123,6 +167,30 @@ PRICE_IDS: dict[str, dict[str, str]] = {
     },
 }
 
+# Somente leitura: env lido uma vez no import (o lookup memoizado depende disso)
+PRICE_IDS: MappingProxyType[str, MappingProxyType[str, str]] = MappingProxyType({
+    product_key: MappingProxyType(prices) for product_key, prices in _RAW_PRICE_IDS.items()
+})
+
+# Lookup plano por (produto, plano, intervalo), montado uma vez no import
+_FLAT_PRICE_IDS: dict[tuple[str, str, str], str] = {
+    (product_key, *price_key.split("_", 1)): price_id
+    for product_key, prices in PRICE_IDS.items()
+    for price_key, price_id in prices.items()
+}
+
+
+@lru_cache(maxsize=64)
+def _resolve_price_id(plan: PlanId, interval: str, product_key: str) -> str | None:
+    """Resolve (plano, intervalo, produto) -> price_id. Memoizado: PRICE_IDS e fixo apos o import."""
+    # FREE nao tem price_id
+    if plan == PlanId.FREE:
+        return None
+    # Produto desconhecido usa os precos do 'default'
+    if product_key not in PRICE_IDS:
+        product_key = "default"
+    return _FLAT_PRICE_IDS.get((product_key, plan.value, interval))
+
 
 # Limites de requisicoes por plano (usado para validacao)
 PLAN_REQUEST_LIMITS: dict[PlanId, int] = {
@@ -136,6 +204,73 @@ PLAN_REQUEST_LIMITS: dict[PlanId, int] = {
 }
 
 
+# Cache em processo email -> Customer (evita Customer.search a cada checkout)
+CUSTOMER_CACHE_TTL_S = 300
+CUSTOMER_CACHE_MAX = 1024
+_customer_cache: "OrderedDict[str, tuple[float, stripe.Customer]]" = OrderedDict()
+
+# Camada compartilhada entre workers: email -> customer_id no Redis
+CUSTOMER_REDIS_TTL_S = 7 * 86400
+
+# Cache negativo customer_id -> expiracao (IDs inexistentes/removidos no Stripe)
+MISSING_CUSTOMER_TTL_S = 300
+MISSING_CUSTOMER_MAX = 10_000
+_missing_customers: "OrderedDict[str, float]" = OrderedDict()
+
+
+# Planos ativos (exibidos no frontend)
+ACTIVE_PLANS = frozenset({PlanId.FREE, PlanId.STARTER, PlanId.PRO, PlanId.ENTERPRISE})
+
+# Resposta de get_all_plans montada uma vez (PLAN_CONFIGS e estatico)
+_ALL_PLANS: tuple[dict, ...] = tuple(
+    {
+        "id": config.plan_id.value,
+        "name": config.name,
+        "price_monthly": config.price_monthly_cents,
+        "price_yearly": config.price_yearly_cents,
+        "requests_per_month": config.requests_per_month,
+        "features": config.features,
+        "currency": "BRL",
+    }
+    for config in PLAN_CONFIGS.values()
+    if config.plan_id in ACTIVE_PLANS
+)
+
+
+# Parametros fixos das sessoes de checkout, montados uma vez. Containers comuns
+# (nao MappingProxyType): o encoder do SDK so serializa dict/list de verdade
+_CHECKOUT_BASE_KWARGS: dict[str, Any] = {
+    "mode": "subscription",
+    "payment_method_types": ["card"],
+    "locale": "pt-BR",
+}
+_CHECKOUT_NEW_KWARGS: dict[str, Any] = {
+    **_CHECKOUT_BASE_KWARGS,
+    "billing_address_collection": "required",
+    "tax_id_collection": {"enabled": True},
+    "customer_update": {
+        "address": "auto",
+        "name": "auto",
+    },
+}
+
+
+# Segredos de webhook resolvidos uma vez; lista separada por virgula permite
+# rotacao (segredo antigo e novo validos durante a troca)
+_WEBHOOK_SECRETS: tuple[str, ...] = tuple(
+    secret.strip() for secret in settings.stripe_webhook_secret.split(",") if secret.strip()
+) or ("",)
+
+
+_from_ts = datetime.fromtimestamp
+
+
+def _opt_ts(obj: dict[str, Any], key: str) -> datetime | None:
+    """Timestamp Unix opcional do payload -> datetime (uma unica busca no dict)."""
+    value = obj.get(key)
+    return _from_ts(value) if value else None
+
+
 class StripeService:
     """Service for Stripe payment operations."""
 
@@ -148,30 +283,17 @@ class StripeService:
         """Retorna a configuracao de um plano."""
         return PLAN_CONFIGS.get(plan)
 
-    # Planos ativos (exibidos no frontend)
-    ACTIVE_PLANS = {PlanId.FREE, PlanId.STARTER, PlanId.PRO, PlanId.ENTERPRISE}
+    ACTIVE_PLANS = ACTIVE_PLANS
 
     @staticmethod
     def get_all_plans() -> list[dict]:
         """Retorna todos os planos ativos disponiveis."""
-        return [
-            {
-                "id": config.plan_id.value,
-                "name": config.name,
-                "price_monthly": config.price_monthly_cents,
-                "price_yearly": config.price_yearly_cents,
-                "requests_per_month": config.requests_per_month,
-                "features": config.features,
-                "currency": "BRL",
-            }
-            for config in PLAN_CONFIGS.values()
-            if config.plan_id in StripeService.ACTIVE_PLANS
-        ]
+        return [dict(plan) for plan in _ALL_PLANS]
 
     @staticmethod
-    def get_request_limit(plan: PlanId) -> int:
+    def get_request_limit(plan: PlanId, _limits=PLAN_REQUEST_LIMITS) -> int:
         """Retorna o limite de requisicoes para um plano."""
-        return PLAN_REQUEST_LIMITS.get(plan, 50)
+        return _limits.get(plan, 50)
 
     # ========================================================================
     # METODOS DE CLIENTE
@@ -189,7 +311,8 @@ class StripeService:
             if metadata:
                 customer_metadata.update(metadata)
 
-            customer = stripe.Customer.create(
+            customer = await stripe_call(
+                stripe.Customer.create,
                 email=email,
                 name=name,
                 metadata=customer_metadata,
@@ -200,30 +323,114 @@ class StripeService:
             logger.error("stripe_customer_creation_failed", email=email, error=str(e))
             raise
 
+    @staticmethod
+    def _cache_customer(email: str, customer: stripe.Customer) -> stripe.Customer:
+        key = email.lower()
+        _customer_cache[key] = (time.monotonic() + CUSTOMER_CACHE_TTL_S, customer)
+        _customer_cache.move_to_end(key)
+        while len(_customer_cache) > CUSTOMER_CACHE_MAX:
+            _customer_cache.popitem(last=False)
+        return customer
+
+    @staticmethod
+    def invalidate_customer_cache(customer_id: str) -> None:
+        """Remove do cache as entradas de um customer (apos update/delete)."""
+        for key in [k for k, (_, c) in _customer_cache.items() if c.id == customer_id]:
+            del _customer_cache[key]
+        _missing_customers.pop(customer_id, None)
+
+    @staticmethod
+    async def forget_customer(customer_id: str, email: str | None = None) -> None:
+        """Invalida os caches local e Redis de um customer (ex.: customer.deleted)."""
+        StripeService.invalidate_customer_cache(customer_id)
+        if not email:
+            return
+        redis = await get_redis()
+        if redis is not None:
+            try:
+                await redis.delete(f"stripe:cust:{email.lower()}")
+            except Exception as e:
+                logger.warning("customer_cache_delete_failed", customer_id=customer_id, error=str(e))
+
     @staticmethod
     async def get_or_create_customer(
         email: str,
         name: str | None = None,
+        db: AsyncSession | None = None,
     ) -> stripe.Customer:
-        """Get existing customer or create a new one."""
+        """Get existing customer or create a new one.
+
+        Ordem: cache local -> Redis (email -> id) -> licencas no banco (se `db`)
+        -> Customer.search/create. Nos hits sem API devolve um Customer so com
+        id/email (o checkout so usa .id).
+        """
+        cached = _customer_cache.get(email.lower())
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        redis_key = f"stripe:cust:{email.lower()}"
+        redis = await get_redis()
+        customer_id = None
+        if redis is not None:
+            try:
+                customer_id = await redis.get(redis_key)
+            except Exception as e:
+                logger.warning("customer_cache_read_failed", email=email, error=str(e))
+            if customer_id:
+                customer = stripe.Customer.construct_from(
+                    {"id": customer_id, "email": email}, stripe.api_key
+                )
+                return StripeService._cache_customer(email, customer)
+
+        # Customer ja vinculado a uma licenca (gravado pelos webhooks)
+        if db is not None:
+            customer_id = await LicenseService(db).get_stripe_customer_id(email)
+            if customer_id:
+                customer = stripe.Customer.construct_from(
+                    {"id": customer_id, "email": email}, stripe.api_key
+                )
+                if redis is not None:
+                    try:
+                        await redis.set(redis_key, customer_id, ex=CUSTOMER_REDIS_TTL_S)
+                    except Exception as e:
+                        logger.warning("customer_cache_write_failed", email=email, error=str(e))
+                return StripeService._cache_customer(email, customer)
+
         try:
             # Search for existing customer
-            customers = stripe.Customer.search(query=f'email:"{email}"')
+            customers = await stripe_call(stripe.Customer.search, query=f'email:"{email}"')
             if customers.data:
-                return customers.data[0]
-
-            # Create new customer if not found
-            return await StripeService.create_customer(email, name)
+                customer = customers.data[0]
+            else:
+                # Create new customer if not found
+                customer = await StripeService.create_customer(email, name)
         except stripe.StripeError as e:
             logger.error("stripe_get_customer_failed", email=email, error=str(e))
             raise
 
+        if redis is not None:
+            try:
+                await redis.set(redis_key, customer.id, ex=CUSTOMER_REDIS_TTL_S)
+            except Exception as e:
+                logger.warning("customer_cache_write_failed", email=email, error=str(e))
+        return StripeService._cache_customer(email, customer)
+
     @staticmethod
     async def get_customer(customer_id: str) -> stripe.Customer | None:
         """Retrieve a customer by ID."""
+        expires = _missing_customers.get(customer_id)
+        if expires is not None:
+            if expires > time.monotonic():
+                return None
+            del _missing_customers[customer_id]
+
         try:
-            return stripe.Customer.retrieve(customer_id)
+            return await stripe_call(stripe.Customer.retrieve, customer_id)
         except stripe.InvalidRequestError:
+            _missing_customers[customer_id] = time.monotonic() + MISSING_CUSTOMER_TTL_S
+            _missing_customers.move_to_end(customer_id)
+            while len(_missing_customers) > MISSING_CUSTOMER_MAX:
+                _missing_customers.popitem(last=False)
             return None
         except stripe.StripeError as e:
             logger.error("stripe_get_customer_failed", customer_id=customer_id, error=str(e))
@@ -238,15 +445,22 @@ class StripeService:
     ) -> stripe.Customer:
         """Update a Stripe customer."""
         try:
-            update_data = {}
+            update_data = {
+                key: value
+                for key, value in (("email", email), ("name", name), ("metadata", metadata))
+                if value
+            }
+
+            # Troca de email: o email antigo (e o novo) podem estar mapeados no Redis
+            old_email = None
             if email:
-                update_data["email"] = email
-            if name:
-                update_data["name"] = name
-            if metadata:
-                update_data["metadata"] = metadata
+                current = await StripeService.get_customer(customer_id)
+                old_email = current.email if current else None
 
-            customer = stripe.Customer.modify(customer_id, **update_data)
+            customer = await stripe_call(stripe.Customer.modify, customer_id, **update_data)
+            await StripeService.forget_customer(customer_id, old_email)
+            if email and email.lower() != (old_email or "").lower():
+                await StripeService.forget_customer(customer_id, email)
             logger.info("stripe_customer_updated", customer_id=customer_id)
             return customer
         except stripe.StripeError as e:
@@ -274,11 +488,7 @@ class StripeService:
         Returns:
             Price ID string ou None se nao encontrado
         """
-        # FREE nao tem price_id
-        if plan == PlanId.FREE:
-            return None
-
-        # Determina o produto
+        # Determina o produto (normalizado para str: chave hashable do cache)
         if product is None:
             product_key = "default"
         elif isinstance(product, ProductType):
@@ -286,10 +496,7 @@ class StripeService:
         else:
             product_key = str(product)
 
-        # Busca nos PRICE_IDS
-        product_prices = PRICE_IDS.get(product_key, PRICE_IDS.get("default", {}))
-        price_key = f"{plan.value}_{interval}"
-        return product_prices.get(price_key)
+        return _resolve_price_id(plan, interval, product_key)
 
     # ========================================================================
     # METODOS DE CHECKOUT
@@ -307,6 +514,7 @@ class StripeService:
         trial_days: int | None = None,
         allow_promotion_codes: bool = True,
         customer_name: str | None = None,
+        db: AsyncSession | None = None,
     ) -> stripe.checkout.Session:
         """
         Create a Stripe Checkout session for subscription.
@@ -322,6 +530,7 @@ class StripeService:
             trial_days: Dias de trial (None = usa config padrao)
             allow_promotion_codes: Permitir codigos de desconto
             customer_name: Nome do cliente
+            db: Sessao do banco (opcional) para achar o customer pelas licencas
 
         Returns:
             Stripe Checkout Session
@@ -335,10 +544,7 @@ class StripeService:
             raise ValueError("Plano FREE nao requer checkout. Use o endpoint de registro.")
 
         try:
-            # Get or create customer
-            customer = await StripeService.get_or_create_customer(email, customer_name)
-
-            # Get price ID
+            # Get price ID (lookup local: falha antes de qualquer chamada ao Stripe)
             price_id = StripeService.get_price_id(plan, interval, product)
             if not price_id:
                 raise ValueError(
@@ -346,6 +552,9 @@ class StripeService:
                     "Configure os IDs no Stripe Dashboard e atualize PRICE_IDS."
                 )
 
+            # Get or create customer
+            customer = await StripeService.get_or_create_customer(email, customer_name, db=db)
+
             # URLs padrao
             if not success_url:
                 success_url = f"{settings.frontend_url}/checkout/success?session_id={{CHECKOUT_SESSION_ID}}"
@@ -372,10 +581,10 @@ class StripeService:
                 subscription_data["trial_period_days"] = trial_days
 
             # Create checkout session
-            session = stripe.checkout.Session.create(
+            session = await stripe_call(
+                stripe.checkout.Session.create,
+                **_CHECKOUT_NEW_KWARGS,
                 customer=customer.id,
-                mode="subscription",
-                payment_method_types=["card"],
                 line_items=[
                     {
                         "price": price_id,
@@ -388,13 +597,6 @@ class StripeService:
                 subscription_data=subscription_data,
                 metadata=metadata,
                 allow_promotion_codes=allow_promotion_codes,
-                billing_address_collection="required",
-                locale="pt-BR",
-                tax_id_collection={"enabled": True},
-                customer_update={
-                    "address": "auto",
-                    "name": "auto",
-                },
             )
 
             logger.info(
@@ -441,10 +643,10 @@ class StripeService:
                 cancel_url = f"{settings.frontend_url}/upgrade/cancel"
 
             # Para upgrade, modifica a subscription existente
-            session = stripe.checkout.Session.create(
+            session = await stripe_call(
+                stripe.checkout.Session.create,
+                **_CHECKOUT_BASE_KWARGS,
                 customer=customer_id,
-                mode="subscription",
-                payment_method_types=["card"],
                 line_items=[{"price": price_id, "quantity": 1}],
                 success_url=success_url,
                 cancel_url=cancel_url,
@@ -454,7 +656,6 @@ class StripeService:
                         "upgraded_from": current_subscription_id,
                     },
                 },
-                locale="pt-BR",
             )
 
             logger.info(
@@ -494,10 +695,11 @@ class StripeService:
                 raise ValueError(f"Price ID nao configurado para {new_plan.value}/{interval}")
 
             # Get current subscription
-            subscription = stripe.Subscription.retrieve(subscription_id)
+            subscription = await stripe_call(stripe.Subscription.retrieve, subscription_id)
 
             # Update to new price
-            updated = stripe.Subscription.modify(
+            updated = await stripe_call(
+                stripe.Subscription.modify,
                 subscription_id,
                 items=[{
                     "id": subscription["items"]["data"][0].id,
@@ -543,7 +745,8 @@ class StripeService:
             if not return_url:
                 return_url = f"{settings.frontend_url}/account"
 
-            session = stripe.billing_portal.Session.create(
+            session = await stripe_call(
+                stripe.billing_portal.Session.create,
                 customer=customer_id,
                 return_url=return_url,
             )
@@ -557,7 +760,8 @@ class StripeService:
     async def get_subscription(subscription_id: str) -> stripe.Subscription:
         """Get subscription details from Stripe."""
         try:
-            return stripe.Subscription.retrieve(
+            return await stripe_call(
+                stripe.Subscription.retrieve,
                 subscription_id,
                 expand=["customer", "default_payment_method"],
             )
@@ -567,12 +771,17 @@ class StripeService:
 
     @staticmethod
     async def list_customer_subscriptions(customer_id: str) -> list[stripe.Subscription]:
-        """List all subscriptions for a customer."""
+        """List all subscriptions for a customer.
+
+        items.data.price ja vem inline (nao e expansivel); a ultima fatura e
+        expandida para evitar um Invoice.retrieve por assinatura.
+        """
         try:
-            subscriptions = stripe.Subscription.list(
+            subscriptions = await stripe_call(
+                stripe.Subscription.list,
                 customer=customer_id,
                 status="all",
-                expand=["data.default_payment_method"],
+                expand=["data.default_payment_method", "data.latest_invoice"],
             )
             return list(subscriptions.data)
         except stripe.StripeError as e:
@@ -595,13 +804,15 @@ class StripeService:
         """
         try:
             if at_period_end:
-                subscription = stripe.Subscription.modify(
+                subscription = await stripe_call(
+                    stripe.Subscription.modify,
                     subscription_id,
                     cancel_at_period_end=True,
                     metadata={"cancellation_reason": cancellation_reason} if cancellation_reason else None,
                 )
             else:
-                subscription = stripe.Subscription.cancel(
+                subscription = await stripe_call(
+                    stripe.Subscription.cancel,
                     subscription_id,
                     cancellation_details={
                         "comment": cancellation_reason,
@@ -627,7 +838,8 @@ class StripeService:
         Apenas funciona se cancel_at_period_end=True e ainda nao expirou.
         """
         try:
-            subscription = stripe.Subscription.modify(
+            subscription = await stripe_call(
+                stripe.Subscription.modify,
                 subscription_id,
                 cancel_at_period_end=False,
             )
@@ -652,7 +864,8 @@ class StripeService:
             if resume_at:
                 pause_data["resumes_at"] = int(resume_at.timestamp())
 
-            subscription = stripe.Subscription.modify(
+            subscription = await stripe_call(
+                stripe.Subscription.modify,
                 subscription_id,
                 pause_collection=pause_data,
             )
@@ -666,7 +879,8 @@ class StripeService:
     async def resume_subscription(subscription_id: str) -> stripe.Subscription:
         """Resume a paused subscription."""
         try:
-            subscription = stripe.Subscription.modify(
+            subscription = await stripe_call(
+                stripe.Subscription.modify,
                 subscription_id,
                 pause_collection="",
             )
@@ -697,12 +911,19 @@ class StripeService:
             ValueError: Payload invalido
         """
         try:
-            event = stripe.Webhook.construct_event(
-                payload,
-                signature,
-                settings.stripe_webhook_secret,
-            )
-            return event
+            # Verifica a assinatura e faz o parse direto: os handlers so usam acesso
+            # por chave, entao dispensa o StripeObject montado pelo construct_event
+            text = payload.decode("utf-8") if isinstance(payload, bytes) else payload
+            for i, secret in enumerate(_WEBHOOK_SECRETS):
+                try:
+                    stripe.WebhookSignature.verify_header(
+                        text, signature, secret, stripe.Webhook.DEFAULT_TOLERANCE
+                    )
+                    break
+                except stripe.SignatureVerificationError:
+                    if i == len(_WEBHOOK_SECRETS) - 1:
+                        raise
+            return _json_loads(payload)
         except stripe.SignatureVerificationError as e:
             logger.error("webhook_signature_invalid", error=str(e))
             raise
@@ -721,13 +942,14 @@ class StripeService:
         - customer.subscription.deleted
         """
         subscription = event["data"]["object"]
+        get = subscription.get
 
         # Extract period dates
-        current_period_start = datetime.fromtimestamp(subscription["current_period_start"])
-        current_period_end = datetime.fromtimestamp(subscription["current_period_end"])
+        current_period_start = _from_ts(subscription["current_period_start"])
+        current_period_end = _from_ts(subscription["current_period_end"])
 
         # Get metadata
-        metadata = subscription.get("metadata", {})
+        metadata = get("metadata", {})
 
         # Get plan from metadata or from price
         plan = metadata.get("plan", "professional")
@@ -737,13 +959,15 @@ class StripeService:
 
         # Get price info if available
         price_info = None
-        if subscription.get("items", {}).get("data"):
-            item = subscription["items"]["data"][0]
+        items = get("items", {}).get("data")
+        if items:
+            price = items[0].get("price", {})
+            price_get = price.get
             price_info = {
-                "price_id": item.get("price", {}).get("id"),
-                "amount": item.get("price", {}).get("unit_amount"),
-                "currency": item.get("price", {}).get("currency"),
-                "interval": item.get("price", {}).get("recurring", {}).get("interval"),
+                "price_id": price_get("id"),
+                "amount": price_get("unit_amount"),
+                "currency": price_get("currency"),
+                "interval": price_get("recurring", {}).get("interval"),
             }
 
         return {
@@ -754,22 +978,10 @@ class StripeService:
             "product": product,
             "current_period_start": current_period_start,
             "current_period_end": current_period_end,
-            "cancel_at_period_end": subscription.get("cancel_at_period_end", False),
-            "canceled_at": (
-                datetime.fromtimestamp(subscription["canceled_at"])
-                if subscription.get("canceled_at")
-                else None
-            ),
-            "trial_start": (
-                datetime.fromtimestamp(subscription["trial_start"])
-                if subscription.get("trial_start")
-                else None
-            ),
-            "trial_end": (
-                datetime.fromtimestamp(subscription["trial_end"])
-                if subscription.get("trial_end")
-                else None
-            ),
+            "cancel_at_period_end": get("cancel_at_period_end", False),
+            "canceled_at": _opt_ts(subscription, "canceled_at"),
+            "trial_start": _opt_ts(subscription, "trial_start"),
+            "trial_end": _opt_ts(subscription, "trial_end"),
             "price_info": price_info,
         }
 
@@ -781,23 +993,25 @@ class StripeService:
         Evento: checkout.session.completed
         """
         session = event["data"]["object"]
+        get = session.get
 
-        metadata = session.get("metadata", {})
+        metadata = get("metadata", {})
+        details = get("customer_details", {})
 
         return {
             "session_id": session["id"],
-            "customer_id": session.get("customer"),
-            "subscription_id": session.get("subscription"),
-            "email": session.get("customer_email") or session.get("customer_details", {}).get("email"),
-            "name": session.get("customer_details", {}).get("name"),
-            "mode": session.get("mode"),
-            "payment_status": session.get("payment_status"),
-            "status": session.get("status"),
+            "customer_id": get("customer"),
+            "subscription_id": get("subscription"),
+            "email": get("customer_email") or details.get("email"),
+            "name": details.get("name"),
+            "mode": get("mode"),
+            "payment_status": get("payment_status"),
+            "status": get("status"),
             "plan": metadata.get("plan", "professional"),
             "product": metadata.get("product", "default"),
-            "amount_total": session.get("amount_total"),
-            "currency": session.get("currency"),
-            "client_reference_id": session.get("client_reference_id"),
+            "amount_total": get("amount_total"),
+            "currency": get("currency"),
+            "client_reference_id": get("client_reference_id"),
         }
 
     @staticmethod
@@ -808,30 +1022,23 @@ class StripeService:
         Eventos: invoice.paid, invoice.payment_failed
         """
         invoice = event["data"]["object"]
+        get = invoice.get
 
         return {
             "invoice_id": invoice["id"],
-            "customer_id": invoice.get("customer"),
-            "subscription_id": invoice.get("subscription"),
-            "email": invoice.get("customer_email"),
-            "status": invoice.get("status"),
-            "amount_paid": invoice.get("amount_paid"),
-            "amount_due": invoice.get("amount_due"),
-            "currency": invoice.get("currency"),
-            "paid": invoice.get("paid", False),
-            "billing_reason": invoice.get("billing_reason"),
-            "invoice_pdf": invoice.get("invoice_pdf"),
-            "hosted_invoice_url": invoice.get("hosted_invoice_url"),
-            "period_start": (
-                datetime.fromtimestamp(invoice["period_start"])
-                if invoice.get("period_start")
-                else None
-            ),
-            "period_end": (
-                datetime.fromtimestamp(invoice["period_end"])
-                if invoice.get("period_end")
-                else None
-            ),
+            "customer_id": get("customer"),
+            "subscription_id": get("subscription"),
+            "email": get("customer_email"),
+            "status": get("status"),
+            "amount_paid": get("amount_paid"),
+            "amount_due": get("amount_due"),
+            "currency": get("currency"),
+            "paid": get("paid", False),
+            "billing_reason": get("billing_reason"),
+            "invoice_pdf": get("invoice_pdf"),
+            "hosted_invoice_url": get("hosted_invoice_url"),
+            "period_start": _opt_ts(invoice, "period_start"),
+            "period_end": _opt_ts(invoice, "period_end"),
         }
 
     # ========================================================================
@@ -845,7 +1052,8 @@ class StripeService:
     ) -> list[stripe.Invoice]:
         """List invoices for a customer."""
         try:
-            invoices = stripe.Invoice.list(
+            invoices = await stripe_call(
+                stripe.Invoice.list,
                 customer=customer_id,
                 limit=limit,
             )
@@ -858,7 +1066,7 @@ class StripeService:
     async def get_upcoming_invoice(customer_id: str) -> stripe.Invoice | None:
         """Get the upcoming invoice for a customer."""
         try:
-            return stripe.Invoice.upcoming(customer=customer_id)
+            return await stripe_call(stripe.Invoice.upcoming, customer=customer_id)
         except stripe.InvalidRequestError:
             # No upcoming invoice
             return None
@@ -879,10 +1087,11 @@ class StripeService:
         Usado se voce decidir cobrar por uso em vez de planos fixos.
         """
         try:
-            usage_record = stripe.SubscriptionItem.create_usage_record(
+            usage_record = await stripe_call(
+                stripe.SubscriptionItem.create_usage_record,
                 subscription_item_id,
                 quantity=quantity,
-                timestamp=int((timestamp or datetime.utcnow()).timestamp()),
+                timestamp=int(timestamp.timestamp()) if timestamp else int(time.time()),
                 action=action,
             )
             logger.info(
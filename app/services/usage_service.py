@@ -1,18 +1,98 @@
 """
 Usage tracking service for monitoring API operations
+
+Com Redis disponivel, os incrementos sao acumulados em contadores
+(`usage:{license_id}:{data}`) e gravados no Postgres em lote por
+flush_pending_usage(); sem Redis, grava direto no banco.
 """
+import asyncio
+import secrets
+import time
+from contextlib import asynccontextmanager
 from datetime import date, datetime
-from typing import Optional
+from typing import AsyncIterator, Optional
+from uuid import uuid4
 
 import structlog
-from sqlalchemy import select, func
+from sqlalchemy import and_, bindparam, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.database import get_db_context
 from app.models.license import License, PlanId
 from app.models.usage import UsageRecord
+from app.services.license_service import LicenseService
+from app.services.redis_client import get_redis
 
 logger = structlog.get_logger()
 
+# Intervalo do flush Redis -> Postgres
+USAGE_FLUSH_INTERVAL_S = 30.0
+# Contador diario vive um pouco mais que o dia
+USAGE_COUNTER_TTL_S = 2 * 24 * 3600
+# Set com as chaves de incrementos pendentes (evita SCAN no keyspace)
+USAGE_DIRTY_KEY = "usage:dirty"
+
+# Soma delta em licenses.total_operations (Core: executemany, sem bulk update do ORM).
+# updated_at fica como esta: uso nao e alteracao da licenca
+_licenses = License.__table__
+_BUMP_TOTAL_OPERATIONS = (
+    update(_licenses)
+    .where(_licenses.c.id == bindparam("license_id"))
+    .values(
+        total_operations=_licenses.c.total_operations + bindparam("delta"),
+        updated_at=_licenses.c.updated_at,
+    )
+)
+
+# Limitador de trabalho concorrente por dono (licenca, sessao do browser...), um
+# sorted set por dono. Slots em uso sao renovados a cada CONCURRENCY_HEARTBEAT_S;
+# entradas mais velhas que a janela morreram sem liberar
+MAX_CONCURRENT_PER_OWNER = 10
+CONCURRENCY_WINDOW_S = 60
+CONCURRENCY_HEARTBEAT_S = CONCURRENCY_WINDOW_S / 3
+
+# ZREMRANGEBYSCORE + ZCARD + ZADD atomicos
+_ACQUIRE_SLOT_LUA = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1] - ARGV[2])
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+# Script registrado no cliente Redis compartilhado (EVALSHA; o redis-py recarrega
+# em NOSCRIPT). Re-registrado se get_redis() trocar de cliente
+_acquire_slot_registered: tuple | None = None
+
+
+def _acquire_slot_script(redis):
+    global _acquire_slot_registered
+    if _acquire_slot_registered is None or _acquire_slot_registered[0] is not redis:
+        _acquire_slot_registered = (redis, redis.register_script(_ACQUIRE_SLOT_LUA))
+    return _acquire_slot_registered[1]
+
+
+async def _renew_slot(redis, key: str, request_id: str) -> None:
+    """Renova o score do slot enquanto o trabalho roda (evita poda por janela)."""
+    while True:
+        await asyncio.sleep(CONCURRENCY_HEARTBEAT_S)
+        try:
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.zadd(key, {request_id: time.time()}, xx=True)
+                pipe.expire(key, CONCURRENCY_WINDOW_S)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning("concurrency_renew_failed", key=key, error=str(e))
+
+_OPERATION_FIELDS = {
+    "search": "search_operations",
+    "download": "download_operations",
+    "automation": "automation_operations",
+}
+
 
 # Plan limits - operacoes por DIA
 PLAN_LIMITS = {
@@ -32,6 +112,46 @@ class UsageService:
     def __init__(self, db: AsyncSession):
         self.db = db
 
+    @staticmethod
+    @asynccontextmanager
+    async def concurrency_slot(
+        owner_id: str,
+        limit: int = MAX_CONCURRENT_PER_OWNER,
+    ) -> AsyncIterator[bool]:
+        """
+        Reserva um slot de execucao concorrente para `owner_id`.
+
+        Para trabalho demorado (automacao Playwright). Produz False se o dono ja
+        tem `limit` execucoes em andamento. Sem Redis o limitador fica desligado.
+        O slot e renovado em background enquanto o bloco roda.
+        """
+        key = f"concurrency:{owner_id}"
+        request_id = secrets.token_hex(4)
+        redis = await get_redis()
+        acquired = True
+        renew_task = None
+        if redis is not None:
+            try:
+                acquired = bool(await _acquire_slot_script(redis)(
+                    keys=[key],
+                    args=[time.time(), CONCURRENCY_WINDOW_S, limit, request_id],
+                ))
+            except Exception as e:
+                logger.warning("concurrency_limiter_failed", owner_id=owner_id, error=str(e))
+                redis = None
+        if redis is not None and acquired:
+            renew_task = asyncio.create_task(_renew_slot(redis, key, request_id))
+        try:
+            yield acquired
+        finally:
+            if renew_task is not None:
+                renew_task.cancel()
+            if redis is not None and acquired:
+                try:
+                    await redis.zrem(key, request_id)
+                except Exception as e:
+                    logger.warning("concurrency_release_failed", owner_id=owner_id, error=str(e))
+
     async def get_today_usage(self, license_id: str) -> UsageRecord | None:
         """Get today's usage record for a license."""
         today = date.today()
@@ -62,6 +182,141 @@ class UsageService:
 
         return usage
 
+    async def _upsert_today_usage(
+        self,
+        license_id: str,
+        product: str,
+        operation_type: str | None,
+        count: int,
+        limit: int,
+    ) -> int | None:
+        """
+        Incrementa o uso de hoje num unico INSERT ... ON CONFLICT ... RETURNING.
+
+        Com limite, o UPDATE so acontece se o contador ainda estiver abaixo
+        dele; nesse caso nenhuma linha volta e retorna None.
+        """
+        values = {
+            "id": str(uuid4()),
+            "license_id": license_id,
+            "usage_date": date.today(),
+            "product": product,
+            "operations_count": count,
+        }
+        field = _OPERATION_FIELDS.get(operation_type)
+        if field:
+            values[field] = count
+
+        stmt = pg_insert(UsageRecord).values(values)
+        update = {
+            "operations_count": UsageRecord.operations_count + count,
+            "updated_at": datetime.utcnow(),
+        }
+        if field:
+            update[field] = getattr(UsageRecord, field) + count
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UsageRecord.license_id, UsageRecord.usage_date],
+            set_=update,
+            where=(UsageRecord.operations_count < limit) if limit != -1 else None,
+        ).returning(UsageRecord.operations_count)
+
+        result = await self.db.execute(stmt)
+        used_today = result.scalar_one_or_none()
+        if used_today is not None:
+            await self.db.execute(
+                _BUMP_TOTAL_OPERATIONS, {"license_id": license_id, "delta": count}
+            )
+        return used_today
+
+    async def _used_today_cached(self, redis, license_id: str) -> tuple[str, int]:
+        """Chave do contador diario no Redis e seu valor (semeado do banco)."""
+        key = f"usage:{license_id}:{date.today().isoformat()}"
+        used = await redis.get(key)
+        if used is None:
+            usage = await self.get_today_usage(license_id)
+            # NX: outro worker pode ter semeado (e incrementado) antes
+            await redis.set(
+                key,
+                usage.operations_count if usage else 0,
+                ex=USAGE_COUNTER_TTL_S,
+                nx=True,
+            )
+            used = await redis.get(key)
+        return key, int(used or 0)
+
+    async def _record_cached(
+        self,
+        redis,
+        license_id: str,
+        product: str,
+        operation_type: str | None,
+        count: int,
+        limit: int,
+    ) -> dict:
+        """Incrementa o contador no Redis e acumula o delta para o flush.
+
+        So levanta excecao se nada ficou registrado no Redis (o chamador cai no
+        UPSERT do banco): falha apos o INCRBY desfaz o incremento antes de levantar.
+        """
+        key, _ = await self._used_today_cached(redis, license_id)
+        used = await redis.incrby(key, count)
+        previous = used - count
+
+        if limit != -1 and previous >= limit:
+            try:
+                await redis.decrby(key, count)
+            except Exception as e:
+                # Negado de qualquer forma; o contador fica alto ate expirar
+                logger.warning("usage_cache_undo_failed", license_id=license_id, error=str(e))
+            return {
+                "allowed": False,
+                "reason": f"Daily limit of {limit} operations reached",
+                "remaining": 0,
+                "used_today": previous,
+                "limit": limit,
+            }
+
+        pending_key = key.replace("usage:", "usage:pending:", 1)
+        try:
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.hincrby(pending_key, "operations_count", count)
+                field = _OPERATION_FIELDS.get(operation_type)
+                if field:
+                    pipe.hincrby(pending_key, field, count)
+                pipe.hset(pending_key, "product", product)
+                pipe.sadd(USAGE_DIRTY_KEY, pending_key)
+                await pipe.execute()
+        except Exception:
+            # MULTI/EXEC: o delta pendente nao foi gravado; desfaz o contador para
+            # o fallback no banco nao contar a operacao duas vezes
+            try:
+                await redis.decrby(key, count)
+            except Exception as e:
+                logger.warning("usage_cache_undo_failed", license_id=license_id, error=str(e))
+            raise
+
+        if limit == -1:
+            return {
+                "allowed": True,
+                "remaining": -1,
+                "used_today": used,
+            }
+
+        remaining = max(0, limit - used)
+        logger.info(
+            "operation_recorded",
+            license_id=license_id,
+            operation_type=operation_type,
+            used_today=used,
+            remaining=remaining,
+        )
+        return {
+            "allowed": True,
+            "remaining": remaining,
+            "used_today": used,
+            "limit": limit,
+        }
+
     async def record_operation(
         self,
         license_id: str,
@@ -70,12 +325,10 @@ class UsageService:
         count: int = 1,
     ) -> dict:
         """Record an operation and check limits."""
-        # Get license to check plan
-        stmt = select(License).where(License.id == license_id)
-        result = await self.db.execute(stmt)
-        license = result.scalar_one_or_none()
+        # Get plan (cache Redis, fallback no banco)
+        plan = await LicenseService(self.db).get_plan_cached(license_id)
 
-        if not license:
+        if plan is None:
             return {
                 "allowed": False,
                 "reason": "License not found",
@@ -83,71 +336,108 @@ class UsageService:
             }
 
         # Get plan limit
-        limit = PLAN_LIMITS.get(license.plan, 50)
-
-        # Get or create usage record
-        usage = await self.get_or_create_today_usage(license_id, product)
+        limit = PLAN_LIMITS.get(plan, 50)
+
+        redis = await get_redis()
+        if redis is not None:
+            try:
+                return await self._record_cached(
+                    redis, license_id, product, operation_type, count, limit
+                )
+            except Exception as e:
+                logger.warning("usage_cache_failed", license_id=license_id, error=str(e))
+
+        # Record operation (UPSERT unico; so incrementa se abaixo do limite)
+        used_today = await self._upsert_today_usage(
+            license_id, product, operation_type, count, limit
+        )
 
         # Check if unlimited
         if limit == -1:
-            usage.increment(count, operation_type)
-            await self.db.flush()
             return {
                 "allowed": True,
                 "remaining": -1,
-                "used_today": usage.operations_count,
+                "used_today": used_today,
             }
 
         # Check limit
-        if usage.operations_count >= limit:
+        if used_today is None:
+            usage = await self.get_today_usage(license_id)
             return {
                 "allowed": False,
                 "reason": f"Daily limit of {limit} operations reached",
                 "remaining": 0,
-                "used_today": usage.operations_count,
+                "used_today": usage.operations_count if usage else 0,
                 "limit": limit,
             }
 
-        # Record operation
-        usage.increment(count, operation_type)
-        await self.db.flush()
-
-        remaining = max(0, limit - usage.operations_count)
+        remaining = max(0, limit - used_today)
 
         logger.info(
             "operation_recorded",
             license_id=license_id,
             operation_type=operation_type,
-            used_today=usage.operations_count,
+            used_today=used_today,
             remaining=remaining,
         )
 
         return {
             "allowed": True,
             "remaining": remaining,
-            "used_today": usage.operations_count,
+            "used_today": used_today,
             "limit": limit,
         }
 
+    async def _plan_and_usage_today(self, license_id: str) -> tuple[PlanId, int] | None:
+        """Plano e uso de hoje numa unica consulta (outer join)."""
+        stmt = (
+            select(License.plan, UsageRecord.operations_count)
+            .outerjoin(
+                UsageRecord,
+                and_(
+                    UsageRecord.license_id == License.id,
+                    UsageRecord.usage_date == date.today(),
+                ),
+            )
+            .where(License.id == license_id)
+        )
+        result = await self.db.execute(stmt)
+        row = result.one_or_none()
+        if row is None:
+            return None
+        plan, used_today = row
+        return plan, used_today or 0
+
     async def check_limit(self, license_id: str) -> dict:
         """Check current usage against limit without recording."""
-        # Get license
-        stmt = select(License).where(License.id == license_id)
-        result = await self.db.execute(stmt)
-        license = result.scalar_one_or_none()
+        redis = await get_redis()
+        used_today = None
+
+        if redis is None:
+            # Sem cache: plano e uso vem juntos do banco
+            row = await self._plan_and_usage_today(license_id)
+            plan, used_today = row if row else (None, None)
+        else:
+            plan = await LicenseService(self.db).get_plan_cached(license_id)
 
-        if not license:
+        if plan is None:
             return {
                 "allowed": False,
                 "reason": "License not found",
             }
 
         # Get plan limit
-        limit = PLAN_LIMITS.get(license.plan, 50)
-
-        # Get today's usage
-        usage = await self.get_today_usage(license_id)
-        used_today = usage.operations_count if usage else 0
+        limit = PLAN_LIMITS.get(plan, 50)
+
+        # Get today's usage (contador do Redis inclui incrementos ainda nao gravados)
+        if redis is not None:
+            try:
+                _, used_today = await self._used_today_cached(redis, license_id)
+            except Exception as e:
+                logger.warning("usage_cache_failed", license_id=license_id, error=str(e))
+        if used_today is None:
+            usage = await self.get_today_usage(license_id)
+            used_today = usage.operations_count if usage else 0
 
         if limit == -1:
             return {
@@ -175,8 +465,15 @@ class UsageService:
         """Get usage statistics for the last N days."""
         from_date = date.today() - timedelta(days=days)
 
+        # Projecao das colunas: tuplas cruas, sem instanciar objetos ORM
         stmt = (
-            select(UsageRecord)
+            select(
+                UsageRecord.usage_date,
+                UsageRecord.operations_count,
+                UsageRecord.search_operations,
+                UsageRecord.download_operations,
+                UsageRecord.automation_operations,
+            )
             .where(
                 UsageRecord.license_id == license_id,
                 UsageRecord.usage_date >= from_date,
@@ -184,27 +481,131 @@ class UsageService:
             .order_by(UsageRecord.usage_date.desc())
         )
         result = await self.db.execute(stmt)
-        records = result.scalars().all()
 
         return [
             {
-                "date": record.usage_date.isoformat(),
-                "total": record.operations_count,
-                "search": record.search_operations,
-                "download": record.download_operations,
-                "automation": record.automation_operations,
+                "date": usage_date.isoformat(),
+                "total": total,
+                "search": search,
+                "download": download,
+                "automation": automation,
             }
-            for record in records
+            for usage_date, total, search, download, automation in result.all()
         ]
 
     async def get_total_usage(self, license_id: str) -> int:
         """Get total operations for a license."""
-        stmt = select(func.sum(UsageRecord.operations_count)).where(
-            UsageRecord.license_id == license_id
-        )
+        # Contador mantido em record_operation / flush_pending_usage (sem SUM por dia)
+        stmt = select(License.total_operations).where(License.id == license_id)
         result = await self.db.execute(stmt)
         total = result.scalar()
         return total or 0
 
 
+async def flush_pending_usage(db: AsyncSession) -> int:
+    """
+    Grava no Postgres os incrementos acumulados no Redis.
+
+    Cada chave pendente e lida e apagada numa transacao (MULTI), entao
+    varios workers podem rodar o flush sem contar duas vezes. Tudo vira
+    um unico INSERT ... ON CONFLICT DO UPDATE somando os deltas.
+    Retorna o numero de registros gravados.
+    """
+    redis = await get_redis()
+    if redis is None:
+        return 0
+
+    keys = await redis.smembers(USAGE_DIRTY_KEY)
+    if not keys:
+        return 0
+
+    now = datetime.utcnow()
+    rows = []
+    for key in keys:
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hgetall(key)
+            pipe.delete(key)
+            pipe.srem(USAGE_DIRTY_KEY, key)
+            pending, _, _ = await pipe.execute()
+        if not pending:
+            continue
+        # usage:pending:{license_id}:{YYYY-MM-DD}
+        _, _, license_id, usage_date = key.split(":", 3)
+        row = {
+            "id": str(uuid4()),
+            "license_id": license_id,
+            "usage_date": date.fromisoformat(usage_date),
+            "product": pending.get("product", "tribunais-mcp"),
+            "operations_count": int(pending.get("operations_count", 0)),
+            "created_at": now,
+            "updated_at": now,
+        }
+        for field in _OPERATION_FIELDS.values():
+            row[field] = int(pending.get(field, 0))
+        rows.append(row)
+
+    if not rows:
+        return 0
+
+    stmt = pg_insert(UsageRecord).values(rows)
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UsageRecord.license_id, UsageRecord.usage_date],
+        set_={
+            "operations_count": UsageRecord.operations_count + excluded.operations_count,
+            "search_operations": UsageRecord.search_operations + excluded.search_operations,
+            "download_operations": UsageRecord.download_operations + excluded.download_operations,
+            "automation_operations": UsageRecord.automation_operations + excluded.automation_operations,
+            "updated_at": excluded.updated_at,
+        },
+    )
+    totals: dict[str, int] = {}
+    for row in rows:
+        totals[row["license_id"]] = totals.get(row["license_id"], 0) + row["operations_count"]
+
+    try:
+        await db.execute(stmt)
+        await db.execute(
+            _BUMP_TOTAL_OPERATIONS,
+            [{"license_id": lid, "delta": delta} for lid, delta in totals.items()],
+        )
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        # Devolve os deltas ao Redis para o proximo flush
+        async with redis.pipeline(transaction=True) as pipe:
+            for row in rows:
+                key = f"usage:pending:{row['license_id']}:{row['usage_date'].isoformat()}"
+                pipe.hincrby(key, "operations_count", row["operations_count"])
+                for field in _OPERATION_FIELDS.values():
+                    if row[field]:
+                        pipe.hincrby(key, field, row[field])
+                pipe.hset(key, "product", row["product"])
+                pipe.sadd(USAGE_DIRTY_KEY, key)
+            await pipe.execute()
+        raise
+
+    logger.info("usage_flushed", records=len(rows))
+    return len(rows)
+
+
+async def _flush_once() -> None:
+    try:
+        async with get_db_context() as db:
+            await flush_pending_usage(db)
+    except Exception as e:
+        logger.error("usage_flush_failed", error=str(e))
+
+
+async def run_usage_flusher(interval: float = USAGE_FLUSH_INTERVAL_S) -> None:
+    """Loop em background: flush periodico dos contadores ate ser cancelado."""
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            await _flush_once()
+    finally:
+        # Cancelado no shutdown: grava o que ainda estiver pendente
+        await _flush_once()
+
+
 from datetime import timedelta
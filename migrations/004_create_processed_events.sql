@@ -0,0 +1,12 @@
+-- Migration: Create processed_events table for webhook idempotency
+-- Date: 2026-10-16
+-- Description: Stores Stripe event ids already applied, so retried deliveries are skipped
+
+CREATE TABLE IF NOT EXISTS processed_events (
+    stripe_event_id VARCHAR(255) PRIMARY KEY,
+    event_type VARCHAR(100) NOT NULL,
+    processed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+-- Comment
+COMMENT ON TABLE processed_events IS 'Stripe webhook events already processed (idempotency guard)';
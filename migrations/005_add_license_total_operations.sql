@@ -0,0 +1,16 @@
+-- Migration: Add denormalized total_operations counter to licenses
+-- Date: 2026-10-16
+-- Description: Keeps the lifetime sum of usage_records.operations_count per license
+
+ALTER TABLE licenses ADD COLUMN IF NOT EXISTS total_operations BIGINT NOT NULL DEFAULT 0;
+
+-- Backfill from existing usage records
+UPDATE licenses l SET total_operations = u.total
+FROM (
+    SELECT license_id, SUM(operations_count) AS total
+    FROM usage_records GROUP BY license_id
+) u
+WHERE l.id = u.license_id;
+
+-- Comment
+COMMENT ON COLUMN licenses.total_operations IS 'Sum of usage_records.operations_count, maintained on every recorded operation';
@@ -0,0 +1,9 @@
+-- Migration: Replace the usage_date B-tree with a BRIN index
+-- Date: 2026-10-16
+-- Description: usage_records is append-only by date; BRIN covers date-range scans at a
+-- fraction of the size. Point lookups keep using idx_usage_license_date (license_id, usage_date).
+
+CREATE INDEX IF NOT EXISTS idx_usage_date_brin ON usage_records
+    USING BRIN (usage_date) WITH (pages_per_range = 32);
+
+DROP INDEX IF EXISTS idx_usage_date;
@@ -14,6 +14,7 @@ Ou configure no .env:
 import argparse
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Add parent directory to path for imports
@@ -112,6 +113,9 @@ PLANS = {
 created_products = {}
 created_prices = {}
 
+# Chamadas ao Stripe sao I/O puro: produtos e precos sao criados em paralelo
+MAX_WORKERS = 8
+
 
 def create_product(plan_id: str, plan_config: dict) -> stripe.Product:
     """Cria um produto no Stripe."""
@@ -174,23 +178,35 @@ def main():
     """Funcao principal."""
     print("Iniciando criacao de produtos e precos...\n")
 
-    # Criar produtos e precos
-    for plan_id, plan_config in PLANS.items():
-        # Criar produto
-        product = create_product(plan_id, plan_config)
-        created_products[plan_id] = product.id
-
-        # Criar precos
-        for interval, price_config in plan_config["prices"].items():
-            price = create_price(
-                product=product,
-                plan_id=plan_id,
-                interval=interval,
-                amount=price_config["amount"],
-                recurring_interval=price_config["interval"],
-            )
-            key = f"{plan_id}_{interval}"
-            created_prices[key] = price.id
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        # Criar produtos (todos de uma vez)
+        plan_ids = list(PLANS)
+        products = dict(zip(
+            plan_ids,
+            executor.map(lambda plan_id: create_product(plan_id, PLANS[plan_id]), plan_ids),
+        ))
+        for plan_id in plan_ids:
+            created_products[plan_id] = products[plan_id].id
+
+        # Criar precos (todos de uma vez; dependem apenas do produto do plano)
+        price_tasks = [
+            (plan_id, interval, price_config)
+            for plan_id in plan_ids
+            for interval, price_config in PLANS[plan_id]["prices"].items()
+        ]
+        prices = executor.map(
+            lambda task: create_price(
+                product=products[task[0]],
+                plan_id=task[0],
+                interval=task[1],
+                amount=task[2]["amount"],
+                recurring_interval=task[2]["interval"],
+            ),
+            price_tasks,
+        )
+        # map preserva a ordem das tarefas: resumo sai na mesma ordem de PLANS
+        for (plan_id, interval, _), price in zip(price_tasks, prices):
+            created_prices[f"{plan_id}_{interval}"] = price.id
 
     # Exibir resumo
     print("\n" + "=" * 60)